@@ -0,0 +1,131 @@
+import csv
+import os
+import numpy as np
+import afscData
+import stageStats
+
+##Cross-base analytics over the base x AFSC incidence matrix built from buildAFSCDict
+##AFSC x AFSC co-location counts are incidence.T @ incidence and the base x base AFSC overlaps are incidence @ incidence.T.
+##Base similarity is the Jaccard index |A & B| / |A | B| of the AFSC sets. Both all-pairs queries are computed a block
+##of rows at a time as dense arrays, each the sparse incidence times a dense slice of it, and every block is reduced
+##to its top k per row with one argpartition. A dense block takes at most maxBlockBytes and the reduction makes a few
+##temporaries of the same size, so peak memory is a small fixed multiple of maxBlockBytes whatever the roster size.
+
+##Rows per block so that a dense float64 block of columnCount columns fits in maxBlockBytes
+def blockRows(columnCount, maxBlockBytes):
+    return max(1, maxBlockBytes // (8 * max(1, columnCount)))
+
+##Largest k entries of every row of a dense block, optionally leaving out the diagonal; the block is overwritten
+##returns (columns, values) arrays of shape (rows, k), each row sorted by descending value then column
+def topKRows(block, k, rowOffset=0, skipDiagonal=True):
+    rowCount, columnCount = block.shape
+    if skipDiagonal:
+        rows = np.arange(rowCount)
+        inside = rows + rowOffset < columnCount
+        block[rows[inside], rows[inside] + rowOffset] = -np.inf
+    k = min(k, columnCount)
+    if k == 0:
+        return np.empty((rowCount, 0), dtype=np.intp), np.empty((rowCount, 0))
+    columns = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(block, columns, axis=1)
+    order = np.lexsort((columns, -values), axis=1)
+    return np.take_along_axis(columns, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+##(name, value) pairs of one row of topKRows, leaving out the pairs with nothing in common
+def topPairs(names, columns, values, convert):
+    return [(names[c], convert(v)) for c, v in zip(columns.tolist(), values.tolist()) if v > 0]
+
+class AFSCAnalytics:
+    def __init__(self, afscDict, baseNames):
+        self.baseNames = list(baseNames)
+        self.baseRow = {base: i for i, base in enumerate(self.baseNames)}
+        self.incidence, self.afscCodes = afscData.buildIncidence(afscDict, self.baseNames)
+        self.afscColumn = {afsc: i for i, afsc in enumerate(self.afscCodes)}
+        self.byAFSC = self.incidence.T.tocsr()
+        self.afscsPerBase = np.diff(self.incidence.indptr)
+        self.basesPerAFSC = np.diff(self.byAFSC.indptr)
+
+    ##AFSC x AFSC sparse matrix of the number of bases where both AFSCs are present, the diagonal holds basesPerAFSC
+    def coOccurrence(self):
+        return (self.byAFSC @ self.incidence).tocsr()
+
+    ##Dense co-location counts of the AFSCs start:end against every AFSC
+    def coOccurrenceBlock(self, start, end):
+        return np.asarray(self.byAFSC @ self.incidence[:, start:end].toarray()).T.copy()
+
+    ##AFSCs most often co-located with the given AFSC as (afsc, shared bases) pairs
+    def topCoOccurring(self, afsc, k=10):
+        column = self.afscColumn[afsc]
+        columns, values = topKRows(self.coOccurrenceBlock(column, column + 1), k, rowOffset=column)
+        return topPairs(self.afscCodes, columns[0], values[0], int)
+
+    ##Dense Jaccard similarity of the bases start:end against every base
+    def jaccardBlock(self, start, end):
+        shared = np.asarray(self.incidence @ self.byAFSC[:, start:end].toarray()).T.copy()
+        union = self.afscsPerBase[start:end, None] + self.afscsPerBase[None, :] - shared
+        np.maximum(union, 1, out=union)
+        return np.divide(shared, union, out=shared)
+
+    ##Bases whose AFSC sets look most like the given base as (base, jaccard) pairs
+    def similarBases(self, base, k=10):
+        row = self.baseRow[base]
+        columns, values = topKRows(self.jaccardBlock(row, row + 1), k, rowOffset=row)
+        return topPairs(self.baseNames, columns[0], values[0], float)
+
+    ##Top k similar bases for every base, a block of rows within maxBlockBytes at a time
+    def allSimilarBases(self, k=10, maxBlockBytes=16 << 20):
+        similar = {}
+        step = blockRows(len(self.baseNames), maxBlockBytes)
+        for start in range(0, len(self.baseNames), step):
+            end = min(start + step, len(self.baseNames))
+            columns, values = topKRows(self.jaccardBlock(start, end), k, rowOffset=start)
+            for row in range(end - start):
+                similar[self.baseNames[start + row]] = topPairs(self.baseNames, columns[row], values[row], float)
+        return similar
+
+    ##Top k co-located AFSCs for every AFSC, a block of rows within maxBlockBytes at a time
+    def allCoOccurring(self, k=10, maxBlockBytes=16 << 20):
+        coOccurring = {}
+        step = blockRows(len(self.afscCodes), maxBlockBytes)
+        for start in range(0, len(self.afscCodes), step):
+            end = min(start + step, len(self.afscCodes))
+            columns, values = topKRows(self.coOccurrenceBlock(start, end), k, rowOffset=start)
+            for row in range(end - start):
+                coOccurring[self.afscCodes[start + row]] = topPairs(self.afscCodes, columns[row], values[row], int)
+        return coOccurring
+
+##Builds the analytics from a baseDict and the afscDict made from it
+def fromBaseDict(baseDict, afscDict=None):
+    if afscDict is None:
+        afscDict = afscData.buildAFSCDict(baseDict)
+    return AFSCAnalytics(afscDict, list(baseDict))
+
+##Analytics stage, writes the top k co-located AFSCs and similar bases as two CSV tables in folder
+@stageStats.timedStage("analytics")
+def writeAnalytics(analytics, folder, k=10):
+    coPath = os.path.join(folder, "AFSC_CoOccurrence.csv")
+    with open(coPath, 'w', newline='') as outFile:
+        writer = csv.writer(outFile)
+        writer.writerow(["AFSC", "Rank", "OtherAFSC", "SharedBases"])
+        for afsc, pairs in analytics.allCoOccurring(k).items():
+            writer.writerows([afsc, rank + 1, other, shared] for rank, (other, shared) in enumerate(pairs))
+            stageStats.record(rowsWritten=len(pairs))
+    similarPath = os.path.join(folder, "Base_Similarity.csv")
+    with open(similarPath, 'w', newline='') as outFile:
+        writer = csv.writer(outFile)
+        writer.writerow(["Base", "Rank", "SimilarBase", "Jaccard"])
+        for base, pairs in analytics.allSimilarBases(k).items():
+            writer.writerows([base, rank + 1, other, round(jaccard, 6)] for rank, (other, jaccard) in enumerate(pairs))
+            stageStats.record(rowsWritten=len(pairs))
+    print(f"AFSC co-occurrence written to {coPath} and base similarity written to {similarPath}")
+    return coPath, similarPath
+
+if __name__ == '__main__':
+    import sys
+    columns = afscData.loadBaseColumns(sys.argv[1])
+    analytics = fromBaseDict(afscData.buildBaseDict(columns))
+    if len(sys.argv) > 2:
+        for other, jaccard in analytics.similarBases(sys.argv[2]):
+            print(f"{other}: {jaccard:.4f}")
+    else:
+        writeAnalytics(analytics, os.path.dirname(os.path.abspath(sys.argv[1])))
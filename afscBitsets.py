@@ -0,0 +1,128 @@
+import numpy as np
+
+##Compact integer-ID representation of base AFSC membership
+##Bases and AFSCs get integer ids, coordinates live in flat float64 arrays and every base holds its AFSCs as a
+##row of 64 bit words in one (bases x words) bitset matrix. Membership tests, "bases holding all of these AFSCs"
+##and counts are bitwise operations over that matrix instead of walks over nested dicts of lists of strings.
+##The mapping pipeline itself stays on afscIndex; the roster is built only by benchmark.py, which times it against
+##the dict layout for large rosters, and by callers that build it themselves with fromBaseDict or fromIndex.
+
+##Counts the set bits of every word, numpy 2 has bitwise_count, older versions unpack the bytes
+def popcount(words):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).astype(np.int64)
+    bits = np.unpackbits(np.ascontiguousarray(words).view(np.uint8).reshape(words.shape + (8,)), axis=-1)
+    return bits.sum(axis=-1, dtype=np.int64)
+
+##Lightweight view of one base, slots keep it to a few pointers per record
+class BaseRecord:
+    __slots__ = ('id', 'name', 'latitude', 'longitude', 'afscs')
+
+    def __init__(self, id, name, latitude, longitude, afscs):
+        self.id = id
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.afscs = afscs
+
+    def __repr__(self):
+        return f"BaseRecord({self.id}, {self.name!r}, {self.latitude}, {self.longitude}, {len(self.afscs)} AFSCs)"
+
+class BaseRoster:
+    __slots__ = ('baseNames', 'afscNames', 'baseId', 'afscId', 'latitude', 'longitude', 'bits')
+
+    def __init__(self, baseNames, afscNames, latitude, longitude, bits):
+        self.baseNames = list(baseNames)
+        self.afscNames = list(afscNames)
+        self.baseId = {base: i for i, base in enumerate(self.baseNames)}
+        self.afscId = {afsc: i for i, afsc in enumerate(self.afscNames)}
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.bits = bits
+
+    def __len__(self):
+        return len(self.baseNames)
+
+    ##Bitset with the bits of the given AFSCs set, None if any AFSC is unknown
+    def afscMask(self, afscs):
+        mask = np.zeros(self.bits.shape[1], dtype=np.uint64)
+        for afsc in afscs:
+            column = self.afscId.get(afsc)
+            if column is None:
+                return None
+            mask[column >> 6] |= np.uint64(1) << np.uint64(column & 63)
+        return mask
+
+    def hasAFSC(self, base, afsc):
+        row = self.baseId.get(base)
+        column = self.afscId.get(afsc)
+        if row is None or column is None:
+            return False
+        return bool((self.bits[row, column >> 6] >> np.uint64(column & 63)) & np.uint64(1))
+
+    ##Bases holding every one of the AFSCs
+    def basesWithAll(self, afscs):
+        mask = self.afscMask(afscs)
+        if mask is None:
+            return []
+        rows = np.flatnonzero(np.all((self.bits & mask) == mask, axis=1))
+        return [self.baseNames[row] for row in rows]
+
+    ##Bases holding at least one of the AFSCs
+    def basesWithAny(self, afscs):
+        mask = self.afscMask([afsc for afsc in afscs if afsc in self.afscId])
+        rows = np.flatnonzero(np.any((self.bits & mask) != 0, axis=1))
+        return [self.baseNames[row] for row in rows]
+
+    ##Number of AFSCs at every base, by popcount of each bitset row
+    def afscCounts(self):
+        return popcount(self.bits).sum(axis=1)
+
+    ##Number of bases holding every AFSC, counted one bit offset at a time over all word columns so the
+    ##temporaries stay the size of the bitset
+    def baseCounts(self):
+        counts = np.empty((self.bits.shape[1], 64), dtype=np.int64)
+        for offset in range(64):
+            counts[:, offset] = ((self.bits >> np.uint64(offset)) & np.uint64(1)).sum(axis=0, dtype=np.int64)
+        return counts.ravel()[:len(self.afscNames)]
+
+    def afscsAt(self, base):
+        row = self.bits[self.baseId[base]]
+        return [afsc for column, afsc in enumerate(self.afscNames) if (row[column >> 6] >> np.uint64(column & 63)) & np.uint64(1)]
+
+    def record(self, base):
+        row = self.baseId[base]
+        return BaseRecord(row, base, float(self.latitude[row]), float(self.longitude[row]), self.afscsAt(base))
+
+    ##Bytes held by the arrays of the roster, not counting the name strings
+    def memoryBytes(self):
+        return self.bits.nbytes + self.latitude.nbytes + self.longitude.nbytes
+
+##Builds the roster from base names, coordinates and an iterable of AFSC collections, one per base
+def buildRoster(baseNames, latitude, longitude, afscLists):
+    afscId = {}
+    rows = []
+    columns = []
+    for row, afscs in enumerate(afscLists):
+        for afsc in afscs:
+            rows.append(row)
+            columns.append(afscId.setdefault(afsc, len(afscId)))
+    rows = np.asarray(rows, dtype=np.int64)
+    columns = np.asarray(columns, dtype=np.int64)
+    bits = np.zeros((len(latitude), max(1, (len(afscId) + 63) // 64)), dtype=np.uint64)
+    np.bitwise_or.at(bits, (rows, columns >> 6), np.left_shift(np.uint64(1), (columns & 63).astype(np.uint64)))
+    return BaseRoster(baseNames, list(afscId), latitude, longitude, bits)
+
+##Builds the roster from a baseDict made by buildBaseDict
+def fromBaseDict(baseDict):
+    bases = list(baseDict)
+    return buildRoster(bases, [baseDict[base]['Location']['Latitude'] for base in bases],
+                       [baseDict[base]['Location']['Longitude'] for base in bases],
+                       [baseDict[base]['AFSC'] for base in bases])
+
+##Builds the roster from an afscIndex.AFSCIndex
+def fromIndex(index):
+    bases = list(index.baseToAFSCs)
+    return buildRoster(bases, [index.coordinates[base][0] for base in bases],
+                       [index.coordinates[base][1] for base in bases],
+                       [sorted(index.baseToAFSCs[base]) for base in bases])
@@ -0,0 +1,82 @@
+import csv
+import sys
+
+##Streaming converter from the wide "AFSC Bases FY2024" roster to the merged long format
+##The wide file has one column per AFSC and one base name per cell. The merged file has one row per base with
+##its coordinates and a Python list literal of AFSC codes, as read by finalCode.importCSVIntoGeodatabase.
+##The wide file is read one row at a time and base membership is kept as an integer bitmask over the AFSC columns,
+##so memory grows with the number of bases, not with the width or length of the roster.
+
+##Strips and collapses the whitespace in a base name, e.g. "BARKSDALE " -> "BARKSDALE"
+def normalizeBaseName(name):
+    return ' '.join(name.split())
+
+##Yields the AFSC header once, then every (base, AFSC column) pair in the wide roster, one row at a time
+def wideMemberships(widePath):
+    with open(widePath, newline='', encoding='utf-8-sig') as wideFile:
+        reader = csv.reader(wideFile)
+        header = next(reader, [])
+        afscCodes = [code.strip() for code in header]
+        yield afscCodes
+        for row in reader:
+            for column, cell in enumerate(row):
+                if column < len(afscCodes) and afscCodes[column] and cell.strip():
+                    yield normalizeBaseName(cell), column
+
+##Reads a gazetteer table of Base, Latitude, Longitude keyed on the normalized base name
+##coordinates are kept as the original text so the merged file matches the gazetteer exactly
+def loadGazetteer(gazetteerPath):
+    gazetteer = {}
+    with open(gazetteerPath, newline='', encoding='utf-8-sig') as gazetteerFile:
+        for row in csv.DictReader(gazetteerFile):
+            gazetteer[normalizeBaseName(row['Base'])] = (row['Latitude'].strip(), row['Longitude'].strip())
+    return gazetteer
+
+##Folds the membership stream into one AFSC bitmask per base
+def baseMasks(memberships):
+    afscCodes = next(memberships)
+    masks = {}
+    for base, column in memberships:
+        masks[base] = masks.get(base, 0) | (1 << column)
+    return afscCodes, masks
+
+##Formats an AFSC list the way the merged file stores it, e.g. "['61C1', '62E1A - USAF']"
+def afscLiteral(afscs):
+    return '[' + ', '.join(f"'{afsc}'" for afsc in afscs) + ']'
+
+##Yields the merged rows joined with the gazetteer, sorted by base; bases without coordinates go to missing
+def mergedRows(afscCodes, masks, gazetteer, missing):
+    for base in sorted(masks):
+        if base not in gazetteer:
+            missing.append(base)
+            continue
+        mask = masks[base]
+        afscs = []
+        column = 0
+        while mask:
+            if mask & 1:
+                afscs.append(afscCodes[column])
+            mask >>= 1
+            column += 1
+        lat, lon = gazetteer[base]
+        yield [base, lat, lon, afscLiteral(afscs)]
+
+##Converts the wide roster into Merged_AFSCs_with_Coordinates.csv format and returns rows written and missing bases
+def convertWideCSV(widePath, gazetteerPath, outPath):
+    gazetteer = loadGazetteer(gazetteerPath)
+    afscCodes, masks = baseMasks(wideMemberships(widePath))
+    missing = []
+    rowsWritten = 0
+    with open(outPath, 'w', newline='', encoding='utf-8') as outFile:
+        writer = csv.writer(outFile, lineterminator='\n')
+        writer.writerow(['Base', 'Latitude', 'Longitude', 'AFSC'])
+        for row in mergedRows(afscCodes, masks, gazetteer, missing):
+            writer.writerow(row)
+            rowsWritten += 1
+    print(f"Wrote {rowsWritten} bases to {outPath}")
+    for base in missing:
+        print(f"No coordinates in the gazetteer for base {base}. Skipped.")
+    return rowsWritten, missing
+
+if __name__ == '__main__':
+    convertWideCSV(sys.argv[1], sys.argv[2], sys.argv[3])
@@ -0,0 +1,196 @@
+import csv
+import functools
+import re
+import sys
+import numpy as np
+import scipy.sparse
+import afscDispersion
+import stageStats
+
+##In-memory columnar engine for the final project data
+##Reads Merged_AFSCs_with_Coordinates.csv once into NumPy columns and computes the same
+##baseDict, afscDict, AFSC counts and standard distances that finalCode.dataMan builds with arcpy cursors.
+##arcpy is only imported when geodatabase output is requested, so the analytics run on machines without ArcGIS.
+
+##Holds each field of the base table as a NumPy column
+class BaseColumns:
+    def __init__(self, base, latitude, longitude, afsc):
+        self.base = base
+        self.latitude = latitude
+        self.longitude = longitude
+        self.afsc = afsc
+
+    def __len__(self):
+        return len(self.base)
+
+##Tokenizer for AFSC list literals such as "['61C1', '62E1A - USAF']", also accepts plain comma separated codes
+afscToken = re.compile(r"[^\[\]',]+")
+
+##Parses an AFSC list literal once into a tuple of interned codes with the spaces removed, "62E1A - USAF" -> "62E1A-USAF"
+##recently seen literals are parsed only once and share the same tuple; the memo is bounded so long running
+##processes such as afscService do not keep every literal they ever parsed
+@functools.lru_cache(maxsize=65536)
+def parseAFSC(value):
+    codes = (token.replace(' ', '') for token in afscToken.findall(value))
+    return tuple(dict.fromkeys(sys.intern(code) for code in codes if code))
+
+##Reads the CSV in a single pass and returns the columns, with the AFSC column parsed into tuples of codes
+def loadBaseColumns(csvPath):
+    bases = []
+    latitudes = []
+    longitudes = []
+    afscs = []
+    with open(csvPath, newline='', encoding='utf-8-sig') as csvFile:
+        for row in csv.DictReader(csvFile):
+            bases.append(row['Base'])
+            latitudes.append(float(row['Latitude']))
+            longitudes.append(float(row['Longitude']))
+            afscs.append(parseAFSC(row['AFSC']))
+    stageStats.record(rowsRead=len(bases))
+    afscColumn = np.empty(len(afscs), dtype=object)
+    afscColumn[:] = afscs
+    return BaseColumns(np.array(bases, dtype=object),
+                       np.array(latitudes, dtype=np.float64),
+                       np.array(longitudes, dtype=np.float64),
+                       afscColumn)
+
+##Builds a dictionary mapping base names to location and the tuple of AFSC codes stationed there
+##a base listed on several rows gets the union of its AFSCs
+def buildBaseDict(columns):
+    baseDict = {}
+    for base, lat, lon, afscs in zip(columns.base, columns.latitude.tolist(), columns.longitude.tolist(), columns.afsc):
+        if base not in baseDict:
+            baseDict[base] = {'Location': {'Latitude': lat, 'Longitude': lon}, 'AFSC': afscs}
+        else:
+            baseDict[base]['AFSC'] = tuple(dict.fromkeys(baseDict[base]['AFSC'] + afscs))
+    return baseDict
+
+##Restores a baseDict read back from JSON, where the AFSC tuples come back as lists, to the layout buildBaseDict returns
+def restoreBaseDict(baseDict):
+    for info in baseDict.values():
+        info['AFSC'] = tuple(sys.intern(afsc) for afsc in info['AFSC'])
+    return baseDict
+
+##Builds a dictionary mapping AFSC codes to the list of bases the AFSC is present at
+def buildAFSCDict(baseDict):
+    afscDict = {}
+    for base, info in baseDict.items():
+        for afsc in info['AFSC']:
+            if afsc not in afscDict:
+                afscDict[afsc] = []
+            afscDict[afsc].append(base)
+    return afscDict
+
+##Counts the unique AFSCs for every row of the base table
+def afscCounts(columns):
+    return np.fromiter((len(afscs) for afscs in columns.afsc), dtype=np.int64, count=len(columns))
+
+##Builds a sparse base x AFSC incidence matrix, one nonzero for every base an AFSC is stationed at
+##bases missing from baseNames are dropped, so AFSCs without coordinates end up with an empty column
+def buildIncidence(afscDict, baseNames):
+    rowForBase = {}
+    for i, base in enumerate(baseNames):
+        rowForBase[base] = i
+    afscCodes = list(afscDict.keys())
+    rows = []
+    cols = []
+    for col, afsc in enumerate(afscCodes):
+        for base in afscDict[afsc]:
+            row = rowForBase.get(base)
+            if row is not None:
+                rows.append(row)
+                cols.append(col)
+    incidence = scipy.sparse.csr_matrix((np.ones(len(rows)), (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64))),
+                                        shape=(len(baseNames), len(afscCodes)))
+    incidence.sum_duplicates()
+    incidence.data[:] = 1.0
+    return incidence, afscCodes
+
+##Calculates the centers, standard distance and ellipse of each AFSC, AFSC -> values in afscDispersion.dispersionFields order
+def dispersion(afscDict, columns, weights=None):
+    incidence, afscCodes = buildIncidence(afscDict, columns.base)
+    stats = afscDispersion.batchDispersion(incidence, columns.latitude, columns.longitude, weights)
+    return afscDispersion.dispersionRows(afscCodes, stats)
+
+##Yields point rows for vectorWriters in the createPointShapeFile layout for a mapping type,
+##optionally only for the given row numbers, skipping invalid coordinates
+def pointRows(columns, counts, mappingVar, rows=None):
+    if rows is None:
+        rows = range(len(columns))
+    for i in rows:
+        base, lat, lon = columns.base[i], float(columns.latitude[i]), float(columns.longitude[i])
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            print(f"Skipped invalid coordinates for {base}: Latitude {lat}, Longitude {lon}")
+            continue
+        if mappingVar == "AFSCCount":
+            yield (base, lat, lon, float(counts[i]), (lon, lat))
+        elif mappingVar == "Base":
+            yield (base, lat, lon, ','.join(columns.afsc[i]), (lon, lat))
+        else:
+            yield (base, lat, lon, (lon, lat))
+
+##Replaces a geodatabase table with a structured array in one NumPyArrayToTable call
+def writeTable(array, geodatabase, tableName):
+    import arcpy
+    arcpy.env.workspace = geodatabase
+    if arcpy.Exists(tableName):
+        arcpy.Delete_management(tableName)
+        stageStats.record(tablesDeleted=1)
+    arcpy.da.NumPyArrayToTable(array, f"{geodatabase}/{tableName}")
+    stageStats.record(tablesCreated=1, rowsWritten=len(array))
+    print(f"Table '{tableName}' written to {geodatabase}")
+    return tableName
+
+##Writes the base columns as the BaseInfo table, AFSCs as comma separated codes and AFSCCount when counts are given
+def writeBaseTable(columns, geodatabase, counts=None, tableName="BaseInfo"):
+    afscStrings = [','.join(afscs) for afscs in columns.afsc]
+    baseWidth = max([len(base) for base in columns.base] + [1])
+    afscWidth = max([len(afsc) for afsc in afscStrings] + [1])
+    fields = [('Base', f'U{baseWidth}'), ('Latitude', 'f8'), ('Longitude', 'f8'), ('AFSC', f'U{afscWidth}')]
+    if counts is not None:
+        fields.append(('AFSCCount', 'i4'))
+    baseArray = np.empty(len(columns), dtype=fields)
+    baseArray['Base'] = columns.base
+    baseArray['Latitude'] = columns.latitude
+    baseArray['Longitude'] = columns.longitude
+    baseArray['AFSC'] = afscStrings
+    if counts is not None:
+        baseArray['AFSCCount'] = counts
+    return writeTable(baseArray, geodatabase, tableName)
+
+##Writes the computed base and AFSC tables into a geodatabase in one operation each
+def writeGeodatabase(columns, counts, afscDispersionRows, folder, geodatabaseName):
+    import arcpy
+    gdbPath = f"{folder}/{geodatabaseName}.gdb"
+    if not arcpy.Exists(gdbPath):
+        arcpy.CreateFileGDB_management(folder, geodatabaseName)
+        print(f"Geodatabase created at: {gdbPath}")
+
+    afscArray = afscDispersion.dispersionArray(afscDispersionRows)
+
+    baseTable = writeBaseTable(columns, gdbPath, counts)
+    afscTable = writeTable(afscArray, gdbPath, "AFSCTable")
+    return gdbPath, baseTable, afscTable
+
+##Runs the whole data pipeline from the CSV, only touching arcpy if a geodatabase is requested
+def runEngine(csvPath, folder=None, geodatabaseName=None):
+    columns = loadBaseColumns(csvPath)
+    baseDict = buildBaseDict(columns)
+    afscDict = buildAFSCDict(baseDict)
+    counts = afscCounts(columns)
+    afscDispersionRows = dispersion(afscDict, columns)
+    distanceColumn = [name for name, fieldType in afscDispersion.dispersionFields].index("StandardDistance")
+    afscToDistance = {afsc: values[distanceColumn] for afsc, values in afscDispersionRows.items()}
+    result = {'columns': columns, 'baseDict': baseDict, 'afscDict': afscDict, 'afscCounts': counts,
+              'standardDistances': afscToDistance, 'dispersion': afscDispersionRows}
+    if folder is not None and geodatabaseName is not None:
+        geodatabase, baseTable, afscTable = writeGeodatabase(columns, counts, afscDispersionRows, folder, geodatabaseName)
+        result['geodatabase'] = geodatabase
+        result['baseTable'] = baseTable
+        result['afscTable'] = afscTable
+    return result
+
+if __name__ == '__main__':
+    result = runEngine(*sys.argv[1:4])
+    for afsc, distance in result['standardDistances'].items():
+        print(f"{afsc}: {distance:.4f}")
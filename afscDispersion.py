@@ -0,0 +1,73 @@
+import numpy as np
+
+##Batch spatial dispersion of every AFSC from the base x AFSC incidence matrix
+##For all AFSCs at once: mean center, weighted center, standard distance and the standard deviational ellipse.
+##Sums over the bases of each AFSC are sparse products or bincounts over the nonzeros, so there is no per AFSC loop.
+##Units follow standardDistance: planar degrees of latitude/longitude. The ellipse axes are one standard deviation
+##along the principal directions and the rotation is the major axis angle clockwise from north, 0 to 180 degrees.
+
+##AFSC table fields written by the dispersion stage, in the order of the rows of dispersionRows
+dispersionFields = [("BaseCount", "LONG"), ("MeanLatitude", "DOUBLE"), ("MeanLongitude", "DOUBLE"),
+                    ("WeightedLatitude", "DOUBLE"), ("WeightedLongitude", "DOUBLE"), ("StandardDistance", "DOUBLE"),
+                    ("EllipseMajor", "DOUBLE"), ("EllipseMinor", "DOUBLE"), ("EllipseRotation", "DOUBLE")]
+
+##Computes every dispersion field for every AFSC column of the incidence matrix
+##weights are per base (row) and default to the number of AFSCs at the base, a stand-in for billet counts
+def batchDispersion(incidence, latitude, longitude, weights=None):
+    byAFSC = incidence.T.tocsr()
+    if weights is None:
+        weights = np.diff(incidence.tocsr().indptr)
+    weights = np.asarray(weights, dtype=np.float64)
+    basesPerAFSC = np.diff(byAFSC.indptr)
+    counts = np.maximum(basesPerAFSC, 1)
+    meanLat = (byAFSC @ latitude) / counts
+    meanLon = (byAFSC @ longitude) / counts
+    weightSums = byAFSC @ weights
+    safeWeights = np.where(weightSums > 0, weightSums, 1.0)
+    weightedLat = np.where(weightSums > 0, (byAFSC @ (weights * latitude)) / safeWeights, meanLat)
+    weightedLon = np.where(weightSums > 0, (byAFSC @ (weights * longitude)) / safeWeights, meanLon)
+
+    ##second moments about the mean center, x is longitude and y is latitude
+    afscOfNonzero = np.repeat(np.arange(byAFSC.shape[0]), basesPerAFSC)
+    dx = longitude[byAFSC.indices] - meanLon[afscOfNonzero]
+    dy = latitude[byAFSC.indices] - meanLat[afscOfNonzero]
+    sxx = np.bincount(afscOfNonzero, weights=dx * dx, minlength=byAFSC.shape[0]) / counts
+    syy = np.bincount(afscOfNonzero, weights=dy * dy, minlength=byAFSC.shape[0]) / counts
+    sxy = np.bincount(afscOfNonzero, weights=dx * dy, minlength=byAFSC.shape[0]) / counts
+
+    ##eigenvalues of the 2 x 2 covariance give the ellipse axes, its major eigenvector the rotation
+    half = np.sqrt(((sxx - syy) / 2.0) ** 2 + sxy ** 2)
+    major = np.sqrt((sxx + syy) / 2.0 + half)
+    minor = np.sqrt(np.maximum((sxx + syy) / 2.0 - half, 0.0))
+    angleFromEast = 0.5 * np.degrees(np.arctan2(2.0 * sxy, sxx - syy))
+    rotation = np.mod(90.0 - angleFromEast, 180.0)
+
+    stats = {"BaseCount": basesPerAFSC, "MeanLatitude": meanLat, "MeanLongitude": meanLon,
+             "WeightedLatitude": weightedLat, "WeightedLongitude": weightedLon,
+             "StandardDistance": np.sqrt(sxx + syy), "EllipseMajor": major, "EllipseMinor": minor,
+             "EllipseRotation": rotation}
+    for name, fieldType in dispersionFields:
+        if fieldType == "DOUBLE":
+            stats[name] = np.where(basesPerAFSC == 0, np.nan, stats[name])
+    return stats
+
+##AFSC -> tuple of field values in dispersionFields order, leaving out AFSCs without any located base
+def dispersionRows(afscCodes, stats):
+    rows = {}
+    values = [stats[name].tolist() for name, fieldType in dispersionFields]
+    for i, afsc in enumerate(afscCodes):
+        if stats["BaseCount"][i] == 0:
+            print(f"No valid coordinates found for AFSC {afsc}. Skipping.")
+            continue
+        rows[afsc] = tuple(column[i] for column in values)
+    return rows
+
+##Structured array of the AFSC table with the AFSC code and every dispersion field
+def dispersionArray(rows):
+    afscWidth = max([len(afsc) for afsc in rows] + [1])
+    fields = [('AFSC', f'U{afscWidth}')] + [(name, 'i4' if fieldType == "LONG" else 'f8') for name, fieldType in dispersionFields]
+    array = np.empty(len(rows), dtype=fields)
+    array['AFSC'] = list(rows.keys())
+    for j, (name, fieldType) in enumerate(dispersionFields):
+        array[name] = [values[j] for values in rows.values()]
+    return array
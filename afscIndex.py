@@ -0,0 +1,138 @@
+import array
+import os
+import struct
+
+##Bidirectional AFSC <-> Base index with base coordinates
+##Membership is held in sets in both directions, and the index is saved to a compact binary file beside the
+##geodatabase so a mapping session can load it instead of rebuilding the dictionaries from the tables.
+
+##File layout: magic, counts, NUL separated base and AFSC names, base coordinates as doubles,
+##then the base -> AFSC membership as CSR offsets and AFSC ids
+indexMagic = b'AFSCIDX1'
+headerFormat = '<8sIIIII'
+
+class AFSCIndex:
+    def __init__(self):
+        self.baseToAFSCs = {}
+        self.afscToBases = {}
+        self.coordinates = {}
+
+    ##Adds one base row, merging AFSCs when the base appears more than once
+    def addBase(self, base, lat, lon, afscs):
+        if base not in self.baseToAFSCs:
+            self.baseToAFSCs[base] = set()
+            self.coordinates[base] = (lat, lon)
+        for afsc in afscs:
+            self.baseToAFSCs[base].add(afsc)
+            self.afscToBases.setdefault(afsc, set()).add(base)
+
+    def afscsAt(self, base):
+        return self.baseToAFSCs.get(base, set())
+
+    def basesWith(self, afsc):
+        return self.afscToBases.get(afsc, set())
+
+    def location(self, base):
+        return self.coordinates[base]
+
+    ##Point rows of a base or AFSC selection in the afscData.pointRows layout for the "Base" or "AFSC" mapping type
+    def selectionRows(self, mappingVar, selection):
+        if mappingVar == "Base":
+            if selection not in self.baseToAFSCs:
+                return []
+            lat, lon = self.coordinates[selection]
+            return [(selection, lat, lon, ','.join(sorted(self.baseToAFSCs[selection])), (lon, lat))]
+        rows = []
+        for base in sorted(self.basesWith(selection)):
+            lat, lon = self.coordinates[base]
+            rows.append((base, lat, lon, (lon, lat)))
+        return rows
+
+    ##Builds the baseDict layout used by finalCode, AFSCs as a tuple of codes
+    def toBaseDict(self):
+        baseDict = {}
+        for base, afscs in self.baseToAFSCs.items():
+            lat, lon = self.coordinates[base]
+            baseDict[base] = {'Location': {'Latitude': lat, 'Longitude': lon}, 'AFSC': tuple(sorted(afscs))}
+        return baseDict
+
+    ##Builds the afscDict layout used by finalCode, AFSC -> list of bases
+    def toAFSCDict(self):
+        return {afsc: sorted(bases) for afsc, bases in self.afscToBases.items()}
+
+    ##Writes the index to a compact binary file
+    def save(self, path):
+        bases = list(self.baseToAFSCs.keys())
+        afscs = list(self.afscToBases.keys())
+        afscId = {afsc: i for i, afsc in enumerate(afscs)}
+        coordinates = array.array('d')
+        offsets = array.array('I', [0])
+        members = array.array('I')
+        for base in bases:
+            coordinates.extend(self.coordinates[base])
+            members.extend(sorted(afscId[afsc] for afsc in self.baseToAFSCs[base]))
+            offsets.append(len(members))
+        names = '\0'.join(bases + afscs).encode('utf-8')
+        tempPath = path + '.tmp'
+        with open(tempPath, 'wb') as outFile:
+            outFile.write(struct.pack(headerFormat, indexMagic, len(bases), len(afscs), len(members), len(names), 0))
+            outFile.write(names)
+            outFile.write(coordinates.tobytes())
+            outFile.write(offsets.tobytes())
+            outFile.write(members.tobytes())
+        os.replace(tempPath, path)
+        print(f"AFSC index with {len(bases)} bases and {len(afscs)} AFSCs saved to {path}")
+        return path
+
+##Builds the index from a baseDict made by buildBaseDict
+def fromBaseDict(baseDict):
+    index = AFSCIndex()
+    for base, info in baseDict.items():
+        index.addBase(base, info['Location']['Latitude'], info['Location']['Longitude'], info['AFSC'])
+    return index
+
+##Loads an index written by AFSCIndex.save
+def loadIndex(path):
+    with open(path, 'rb') as inFile:
+        data = inFile.read()
+    magic, baseCount, afscCount, memberCount, nameBytes, reserved = struct.unpack_from(headerFormat, data)
+    if magic != indexMagic:
+        raise ValueError(f"'{path}' is not an AFSC index file.")
+    position = struct.calcsize(headerFormat)
+    names = data[position:position + nameBytes].decode('utf-8').split('\0') if nameBytes else []
+    position += nameBytes
+    coordinates = array.array('d')
+    coordinates.frombytes(data[position:position + 16 * baseCount])
+    position += 16 * baseCount
+    offsets = array.array('I')
+    offsets.frombytes(data[position:position + 4 * (baseCount + 1)])
+    position += 4 * (baseCount + 1)
+    members = array.array('I')
+    members.frombytes(data[position:position + 4 * memberCount])
+
+    bases = names[:baseCount]
+    afscs = names[baseCount:baseCount + afscCount]
+    index = AFSCIndex()
+    index.afscToBases = {afsc: set() for afsc in afscs}
+    for i, base in enumerate(bases):
+        baseAFSCs = {afscs[member] for member in members[offsets[i]:offsets[i + 1]]}
+        index.baseToAFSCs[base] = baseAFSCs
+        index.coordinates[base] = (coordinates[2 * i], coordinates[2 * i + 1])
+        for afsc in baseAFSCs:
+            index.afscToBases[afsc].add(base)
+    return index
+
+##Path of the index file kept beside the geodatabase
+def indexPath(geodatabase):
+    return os.path.splitext(geodatabase)[0] + "_afscIndex.bin"
+
+##Loads the saved index for a geodatabase, building and saving it from baseDict if it is missing
+def loadOrBuildIndex(geodatabase, baseDict=None):
+    path = indexPath(geodatabase)
+    if os.path.exists(path):
+        return loadIndex(path)
+    if baseDict is None:
+        raise FileNotFoundError(f"No AFSC index at '{path}' and no baseDict to build one from.")
+    index = fromBaseDict(baseDict)
+    index.save(path)
+    return index
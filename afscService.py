@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import json
+import time
+import urllib.parse
+import afscData
+import afscIndex
+import baseSpatial
+import selectionCache
+import stageManifest
+
+##Read-only HTTP/JSON service over the AFSC index, built on asyncio streams from the standard library
+##Endpoints, all GET and all answered with GeoJSON (or plain JSON for /stats):
+##  /base/{name}                      the base point with its AFSCs
+##  /afsc/{code}                      every base holding the AFSC
+##  /nearest?lat=..&lon=..&k=..       the k nearest bases, optionally &afsc=.. for the nearest base holding an AFSC
+##  /stats                            roster counts, request counters and response cache stats
+##Connections are served concurrently and kept alive, and encoded responses are kept in a SelectionCache LRU
+##keyed on the request path, so repeated queries skip both the lookup and the JSON encoding.
+
+statusText = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+##GeoJSON point feature for one base
+def baseFeature(base, lat, lon, **properties):
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": dict({"Base": base}, **properties)}
+
+def featureCollection(features):
+    return {"type": "FeatureCollection", "features": features}
+
+class AFSCService:
+    def __init__(self, index, dataVersion="", cacheSize=256):
+        self.index = index
+        self.spatial = baseSpatial.fromIndex(index)
+        self.dataVersion = dataVersion
+        self.responses = selectionCache.SelectionCache(cacheSize)
+        self.requests = 0
+        self.openConnections = 0
+        self.started = time.time()
+
+    def base(self, name):
+        if name not in self.index.baseToAFSCs:
+            return 404, {"error": f"Unknown base '{name}'"}
+        lat, lon = self.index.location(name)
+        return 200, featureCollection([baseFeature(name, lat, lon, AFSC=sorted(self.index.afscsAt(name)))])
+
+    def afsc(self, code):
+        if code not in self.index.afscToBases:
+            return 404, {"error": f"Unknown AFSC '{code}'"}
+        rows = self.index.selectionRows("AFSC", code)
+        return 200, featureCollection([baseFeature(base, lat, lon) for base, lat, lon, point in rows])
+
+    def nearest(self, query):
+        try:
+            lat = float(query["lat"][0])
+            lon = float(query["lon"][0])
+            k = int(query.get("k", ["1"])[0])
+        except (KeyError, ValueError):
+            return 400, {"error": "nearest needs numeric lat and lon and an integer k"}
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180) or k < 1:
+            return 400, {"error": "lat must be in [-90, 90], lon in [-180, 180] and k at least 1"}
+        if "afsc" in query:
+            distances, bases = self.spatial.nearestWithAFSC(lat, lon, query["afsc"][0])
+        else:
+            distances, bases = self.spatial.nearest(lat, lon, k)
+        features = []
+        for base, distance in zip(bases.ravel().tolist(), distances.ravel().tolist()):
+            if base is None:
+                continue
+            baseLat, baseLon = self.index.location(base)
+            features.append(baseFeature(base, baseLat, baseLon, DistanceKm=round(distance, 3)))
+        return 200, featureCollection(features)
+
+    def stats(self):
+        memberships = sum(len(afscs) for afscs in self.index.baseToAFSCs.values())
+        return 200, {"bases": len(self.index.baseToAFSCs), "afscs": len(self.index.afscToBases), "memberships": memberships,
+                     "requests": self.requests, "openConnections": self.openConnections,
+                     "uptimeSeconds": round(time.time() - self.started, 3), "cache": self.responses.stats()}
+
+    ##Routes a request target to (status, encoded body), cached unless it is /stats or an error
+    def respond(self, target):
+        url = urllib.parse.urlsplit(target)
+        parts = [urllib.parse.unquote(part) for part in url.path.strip('/').split('/')]
+        if parts == ["stats"]:
+            status, body = self.stats()
+            return status, json.dumps(body).encode()
+        entry = self.responses.get("GET", target, self.dataVersion)
+        if entry is not None:
+            return 200, entry.rows
+        if len(parts) == 2 and parts[0] == "base":
+            status, body = self.base(parts[1])
+        elif len(parts) == 2 and parts[0] == "afsc":
+            status, body = self.afsc(parts[1])
+        elif parts == ["nearest"]:
+            status, body = self.nearest(urllib.parse.parse_qs(url.query))
+        else:
+            status, body = 404, {"error": f"No endpoint at '{url.path}'"}
+        encoded = json.dumps(body).encode()
+        if status == 200:
+            self.responses.put("GET", target, self.dataVersion, encoded, None)
+        return status, encoded
+
+    ##Serves every request of one keep-alive connection
+    async def handle(self, reader, writer):
+        self.openConnections += 1
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip().lower()
+                try:
+                    method, target, version = requestLine.decode('latin-1').split()
+                except ValueError:
+                    break
+                self.requests += 1
+                if method != "GET":
+                    status, body = 405, json.dumps({"error": "Only GET is supported"}).encode()
+                else:
+                    status, body = self.respond(target)
+                keepAlive = version == "HTTP/1.1" and headers.get("connection") != "close"
+                contentType = "application/json" if target.startswith("/stats") or status != 200 else "application/geo+json"
+                writer.write(f"HTTP/1.1 {status} {statusText[status]}\r\nContent-Type: {contentType}\r\n"
+                             f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keepAlive else 'close'}\r\n\r\n".encode() + body)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.openConnections -= 1
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"AFSC service with {len(self.index.baseToAFSCs)} bases listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+##Builds the service from the merged CSV, or from a saved AFSC index file
+def fromCSV(csvPath, cacheSize=256):
+    index = afscIndex.fromBaseDict(afscData.buildBaseDict(afscData.loadBaseColumns(csvPath)))
+    return AFSCService(index, stageManifest.hashFile(csvPath), cacheSize)
+
+def fromIndexFile(path, cacheSize=256):
+    return AFSCService(afscIndex.loadIndex(path), stageManifest.hashFile(path), cacheSize)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve base and AFSC lookups as GeoJSON over HTTP.")
+    source = parser.add_argument_group("data source").add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv')
+    source.add_argument('--index')
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--cache', type=int, default=256)
+    args = parser.parse_args()
+    service = fromCSV(args.csv, args.cache) if args.csv else fromIndexFile(args.index, args.cache)
+    asyncio.run(service.serve(args.host, args.port))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import numpy as np
+import scipy.spatial
+
+##Spatial index over base coordinates for nearest-base and radius queries
+##Bases are placed on the unit sphere as x, y, z so a KD-tree on straight-line (chord) distance gives the same
+##neighbours as great-circle distance. Every query takes arrays of latitudes and longitudes and answers them in one call.
+
+earthRadiusKm = 6371.0088
+
+##Converts latitude/longitude in degrees to unit vectors
+def unitVectors(latitude, longitude):
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    cosLat = np.cos(lat)
+    return np.stack([cosLat * np.cos(lon), cosLat * np.sin(lon), np.sin(lat)], axis=-1)
+
+##Converts a chord length on the unit sphere to great-circle kilometres
+def chordToKm(chord):
+    return 2.0 * earthRadiusKm * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+##Converts great-circle kilometres to a chord length on the unit sphere
+def kmToChord(km):
+    return 2.0 * np.sin(np.minimum(np.asarray(km, dtype=np.float64) / earthRadiusKm, np.pi) / 2.0)
+
+class BaseSpatialIndex:
+    def __init__(self, bases, latitude, longitude, afscToBases=None):
+        self.bases = np.array(bases, dtype=object)
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.tree = scipy.spatial.cKDTree(unitVectors(self.latitude, self.longitude))
+        self.afscToBases = afscToBases if afscToBases is not None else {}
+        self.afscTrees = {}
+
+    ##k nearest bases to every query point, returns (distances in km, base names), both shaped (queries, k)
+    def nearest(self, latitude, longitude, k=1):
+        k = min(k, len(self.bases))
+        chords, rows = self.tree.query(unitVectors(np.atleast_1d(latitude), np.atleast_1d(longitude)), k=k)
+        chords = chords.reshape(-1, k)
+        rows = rows.reshape(-1, k)
+        return chordToKm(chords), self.bases[rows]
+
+    ##Bases within radiusKm of every query point, one list of (base, km) per query sorted by distance
+    def withinRadius(self, latitude, longitude, radiusKm):
+        points = unitVectors(np.atleast_1d(latitude), np.atleast_1d(longitude))
+        matches = self.tree.query_ball_point(points, float(kmToChord(radiusKm)))
+        results = []
+        for point, rows in zip(points, matches):
+            rows = np.array(rows, dtype=np.int64)
+            distances = chordToKm(np.linalg.norm(self.tree.data[rows] - point, axis=1)) if rows.size else np.empty(0)
+            order = np.argsort(distances)
+            results.append(list(zip(self.bases[rows[order]].tolist(), distances[order].tolist())))
+        return results
+
+    ##Builds and caches a KD-tree over only the bases holding the AFSC
+    def afscTree(self, afsc):
+        if afsc not in self.afscTrees:
+            holders = set(self.afscToBases.get(afsc, ()))
+            rows = np.array([i for i, base in enumerate(self.bases) if base in holders], dtype=np.int64)
+            tree = scipy.spatial.cKDTree(self.tree.data[rows]) if rows.size else None
+            self.afscTrees[afsc] = (tree, rows)
+        return self.afscTrees[afsc]
+
+    ##Nearest base holding the AFSC for every query point, returns (distances in km, base names)
+    ##queries get an infinite distance and None when no base holds the AFSC
+    def nearestWithAFSC(self, latitude, longitude, afsc):
+        points = unitVectors(np.atleast_1d(latitude), np.atleast_1d(longitude))
+        tree, rows = self.afscTree(afsc)
+        if tree is None:
+            return np.full(len(points), np.inf), np.full(len(points), None, dtype=object)
+        chords, positions = tree.query(points, k=1)
+        return chordToKm(chords), self.bases[rows[positions]]
+
+##Builds the spatial index from the columns afscData.loadBaseColumns reads, one point per distinct base
+def fromColumns(columns, afscDict=None):
+    firstRows = np.sort(np.unique(columns.base.astype(str), return_index=True)[1])
+    return BaseSpatialIndex(columns.base[firstRows], columns.latitude[firstRows], columns.longitude[firstRows], afscDict)
+
+##Builds the spatial index from an afscIndex.AFSCIndex
+def fromIndex(index):
+    bases = list(index.coordinates.keys())
+    latitude = [index.coordinates[base][0] for base in bases]
+    longitude = [index.coordinates[base][1] for base in bases]
+    return BaseSpatialIndex(bases, latitude, longitude, index.afscToBases)
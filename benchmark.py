@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import afscAnalytics
+import afscBitsets
+import afscData
+import afscDispersion
+import bulkWriters
+import vectorWriters
+
+##Benchmark harness for the final project pipeline
+##Generates synthetic merged base/AFSC CSVs from the current ~100 bases up to whole-force rosters, runs every stage
+##of the arcpy-free pipeline on them and records wall time per stage as JSON. With --memory every configuration is run
+##a second time under tracemalloc for the peak memory per stage, so tracing never slows the timed run.
+##tableMaker and createPointShapeFile are measured through their arcpy-free counterparts, the sqlite AFSC table
+##and the vectorWriters point layers, since arcpy is not available on the benchmark machines.
+
+##Writes a synthetic CSV in the Merged_AFSCs_with_Coordinates.csv format
+##each base gets a random subset of about afscsPerBase AFSC codes drawn from afscCount codes
+def generateBaseCSV(path, baseCount, afscCount, afscsPerBase=10, seed=0):
+    rng = np.random.default_rng(seed)
+    afscCodes = [f"{i % 90 + 10}{chr(65 + i // 90 % 26)}{i // 2340 + 1} - USAF" if i % 3 == 0 else
+                 f"{i % 90 + 10}{chr(65 + i // 90 % 26)}{i // 2340 + 1}" for i in range(afscCount)]
+    latitude = np.degrees(np.arcsin(rng.uniform(-0.9, 0.9, baseCount)))
+    longitude = rng.uniform(-180.0, 180.0, baseCount)
+    sizes = np.clip(rng.poisson(afscsPerBase, baseCount), 1, afscCount)
+    with open(path, 'w', encoding='utf-8') as outFile:
+        outFile.write("Base,Latitude,Longitude,AFSC\n")
+        for i in range(baseCount):
+            chosen = np.sort(rng.choice(afscCount, size=sizes[i], replace=False))
+            literal = '[' + ', '.join(f"'{afscCodes[j]}'" for j in chosen) + ']'
+            outFile.write(f'BASE {i:06d},{latitude[i]:.6f},{longitude[i]:.6f},"{literal}"\n')
+    return path
+
+##Runs one stage and appends its record, the wall time in a plain run or the peak traced memory while tracemalloc runs
+def timeStage(results, config, stage, function, *args):
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    value = function(*args)
+    seconds = time.perf_counter() - start
+    if tracing:
+        peak = tracemalloc.get_traced_memory()[1]
+        results.append(dict(config, stage=stage, peakBytes=peak))
+        print(f"{config['bases']:>7} bases {config['afscs']:>5} AFSCs  {stage:<28} {peak / 1e6:10.2f} MB")
+    else:
+        results.append(dict(config, stage=stage, seconds=round(seconds, 6)))
+        print(f"{config['bases']:>7} bases {config['afscs']:>5} AFSCs  {stage:<28} {seconds:9.4f} s")
+    return value
+
+##Creates the AFSC table in a sqlite store and bulk writes the dispersion fields, the tableMaker + standardDistance path
+def sqliteAFSCTable(databasePath, afscDispersionRows):
+    connection = sqlite3.connect(databasePath)
+    with connection:
+        connection.execute('DROP TABLE IF EXISTS AFSCTable')
+        connection.execute('CREATE TABLE AFSCTable (AFSC TEXT)')
+        connection.executemany('INSERT INTO AFSCTable VALUES (?)', [(afsc,) for afsc in afscDispersionRows])
+    connection.close()
+    return bulkWriters.SqliteColumnWriter(databasePath).writeColumns('AFSCTable', 'AFSC', afscDispersion.dispersionFields, afscDispersionRows)
+
+##Runs every stage for one roster size and returns the stage records, with traceMemory the whole run is traced
+def benchmarkConfig(workFolder, baseCount, afscCount, afscsPerBase, seed, traceMemory=False):
+    if traceMemory:
+        tracemalloc.start()
+        try:
+            return benchmarkConfig(workFolder, baseCount, afscCount, afscsPerBase, seed)
+        finally:
+            tracemalloc.stop()
+    config = {'bases': baseCount, 'afscs': afscCount, 'afscsPerBase': afscsPerBase}
+    results = []
+    csvPath = os.path.join(workFolder, f"bases_{baseCount}_{afscCount}.csv")
+    timeStage(results, config, "generate", generateBaseCSV, csvPath, baseCount, afscCount, afscsPerBase, seed)
+    columns = timeStage(results, config, "loadBaseColumns", afscData.loadBaseColumns, csvPath)
+    baseDict = timeStage(results, config, "buildBaseDict", afscData.buildBaseDict, columns)
+    afscDict = timeStage(results, config, "buildAFSCDict", afscData.buildAFSCDict, baseDict)
+    timeStage(results, config, "buildRoster", afscBitsets.fromBaseDict, baseDict)
+    counts = timeStage(results, config, "addAFSCCount", afscData.afscCounts, columns)
+    afscDispersionRows = timeStage(results, config, "standardDistance", afscData.dispersion, afscDict, columns)
+    analytics = timeStage(results, config, "analyticsIncidence", afscAnalytics.fromBaseDict, baseDict, afscDict)
+    timeStage(results, config, "coOccurrenceTopK", analytics.allCoOccurring, 10)
+    timeStage(results, config, "baseSimilarityTopK", analytics.allSimilarBases, 10)
+    timeStage(results, config, "tableMaker", sqliteAFSCTable, os.path.join(workFolder, "bench.sqlite"), afscDispersionRows)
+    for extension in ("gpkg", "fgb"):
+        layerPath = os.path.join(workFolder, f"baseInfopoints.{extension}")
+        if os.path.exists(layerPath):
+            os.remove(layerPath)
+        timeStage(results, config, f"createPointShapeFile.{extension}", vectorWriters.writePointLayer,
+                  layerPath, "baseInfopoints", "AFSCCount", afscData.pointRows(columns, counts, "AFSCCount"))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the final project pipeline on synthetic rosters.")
+    parser.add_argument('--bases', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--afscs', type=int, nargs='+', default=[50, 500])
+    parser.add_argument('--afscs-per-base', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--memory', action='store_true', help="also record peak memory per stage in a separate traced run")
+    parser.add_argument('--out', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="afscBench") as workFolder:
+        for baseCount in args.bases:
+            for afscCount in args.afscs:
+                afscsPerBase = min(args.afscs_per_base, afscCount)
+                timed = benchmarkConfig(workFolder, baseCount, afscCount, afscsPerBase, args.seed)
+                if args.memory:
+                    traced = benchmarkConfig(workFolder, baseCount, afscCount, afscsPerBase, args.seed, traceMemory=True)
+                    for record, tracedRecord in zip(timed, traced):
+                        record['peakBytes'] = tracedRecord['peakBytes']
+                results.extend(timed)
+    report = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+              'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+    with open(args.out, 'w') as outFile:
+        json.dump(report, outFile, indent=1)
+    print(f"Benchmark results written to {args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import sqlite3
+import numpy as np
+import stageStats
+
+##Bulk column writers used by afscDispersion and addAFSCCount
+##Each writer commits a whole result column in one operation instead of one updateRow per row,
+##and writeColumn returns the number of rows it wrote.
+
+##Maps the arcpy field types used in finalCode to NumPy and sqlite column types
+numpyTypes = {"DOUBLE": 'f8', "LONG": 'i4', "TEXT": None}
+sqliteTypes = {"DOUBLE": "REAL", "LONG": "INTEGER", "TEXT": "TEXT"}
+
+##Builds a structured key/value array for arcpy from a dictionary of results
+def columnArray(keyField, valueField, values, fieldType):
+    keys = [str(key) for key in values.keys()]
+    keyWidth = max([len(key) for key in keys] + [1])
+    valueType = numpyTypes[fieldType]
+    if valueType is None:
+        valueType = 'U' + str(max([len(str(value)) for value in values.values()] + [1]))
+    array = np.empty(len(keys), dtype=[(keyField, f'U{keyWidth}'), (valueField, valueType)])
+    array[keyField] = keys
+    array[valueField] = list(values.values())
+    return array
+
+##Builds a structured key/value array for arcpy with several value fields from key -> tuple of values
+def columnsArray(keyField, fields, rows):
+    keys = [str(key) for key in rows.keys()]
+    keyWidth = max([len(key) for key in keys] + [1])
+    dtype = [(keyField, f'U{keyWidth}')]
+    for j, (valueField, fieldType) in enumerate(fields):
+        valueType = numpyTypes[fieldType]
+        if valueType is None:
+            valueType = 'U' + str(max([len(str(values[j])) for values in rows.values()] + [1]))
+        dtype.append((valueField, valueType))
+    array = np.empty(len(keys), dtype=dtype)
+    array[keyField] = keys
+    for j, (valueField, fieldType) in enumerate(fields):
+        array[valueField] = [values[j] for values in rows.values()]
+    return array
+
+##Writes columns into a geodatabase table with a single arcpy.da.ExtendTable call
+class ArcpyColumnWriter:
+    def __init__(self, geodatabase):
+        self.geodatabase = geodatabase
+
+    def writeColumn(self, tableName, keyField, valueField, values, fieldType="DOUBLE"):
+        import arcpy
+        arcpy.env.workspace = self.geodatabase
+        if not values:
+            return 0
+        array = columnArray(keyField, valueField, values, fieldType)
+        ##ExtendTable updates an existing field when append_only is False, so no AddField is needed on reruns
+        arcpy.da.ExtendTable(tableName, keyField, array, keyField, append_only=False)
+        stageStats.record(rowsWritten=len(array))
+        print(f"Wrote {len(array)} values of '{valueField}' to '{tableName}'.")
+        return len(array)
+
+    ##Writes several fields at once, fields is a list of (name, field type) and rows maps key -> tuple of values
+    def writeColumns(self, tableName, keyField, fields, rows):
+        import arcpy
+        arcpy.env.workspace = self.geodatabase
+        if not rows:
+            return 0
+        array = columnsArray(keyField, fields, rows)
+        arcpy.da.ExtendTable(tableName, keyField, array, keyField, append_only=False)
+        stageStats.record(rowsWritten=len(array))
+        print(f"Wrote {len(array)} rows of {len(fields)} fields to '{tableName}'.")
+        return len(array)
+
+##Writes a column into a table of a local sqlite store with a single executemany
+class SqliteColumnWriter:
+    def __init__(self, databasePath):
+        self.databasePath = databasePath
+
+    def writeColumn(self, tableName, keyField, valueField, values, fieldType="DOUBLE"):
+        connection = sqlite3.connect(self.databasePath)
+        try:
+            columns = [row[1] for row in connection.execute(f'PRAGMA table_info("{tableName}")')]
+            if valueField not in columns:
+                connection.execute(f'ALTER TABLE "{tableName}" ADD COLUMN "{valueField}" {sqliteTypes[fieldType]}')
+            ##without an index on the key every UPDATE scans the table and the write grows quadratically
+            connection.execute(f'CREATE INDEX IF NOT EXISTS "{tableName}_{keyField}_idx" ON "{tableName}" ("{keyField}")')
+            with connection:
+                cursor = connection.executemany(f'UPDATE "{tableName}" SET "{valueField}" = ? WHERE "{keyField}" = ?',
+                                                [(value, key) for key, value in values.items()])
+            rowsWritten = cursor.rowcount
+            stageStats.record(rowsWritten=rowsWritten)
+        finally:
+            connection.close()
+        print(f"Wrote {rowsWritten} values of '{valueField}' to '{tableName}'.")
+        return rowsWritten
+
+    ##Writes several fields with one executemany UPDATE, rows maps key -> tuple of values
+    def writeColumns(self, tableName, keyField, fields, rows):
+        connection = sqlite3.connect(self.databasePath)
+        try:
+            columns = [row[1] for row in connection.execute(f'PRAGMA table_info("{tableName}")')]
+            for valueField, fieldType in fields:
+                if valueField not in columns:
+                    connection.execute(f'ALTER TABLE "{tableName}" ADD COLUMN "{valueField}" {sqliteTypes[fieldType]}')
+            connection.execute(f'CREATE INDEX IF NOT EXISTS "{tableName}_{keyField}_idx" ON "{tableName}" ("{keyField}")')
+            assignments = ', '.join(f'"{valueField}" = ?' for valueField, fieldType in fields)
+            with connection:
+                cursor = connection.executemany(f'UPDATE "{tableName}" SET {assignments} WHERE "{keyField}" = ?',
+                                                [tuple(values) + (key,) for key, values in rows.items()])
+            rowsWritten = cursor.rowcount
+            stageStats.record(rowsWritten=rowsWritten)
+        finally:
+            connection.close()
+        print(f"Wrote {rowsWritten} rows of {len(fields)} fields to '{tableName}'.")
+        return rowsWritten
@@ -1,10 +1,21 @@
-import arcpy
 import numpy as np
-import pandas as pd
-import math
+import os
+import shutil
+import tempfile
+import concurrent.futures
+import afscAnalytics
+import afscData
+import afscDispersion
+import afscIndex
+import bulkWriters
+import stageManifest
+import selectionCache
+import stageStats
+import vectorWriters
 
 ##Create Geodatabase for project
 def createGeodatabase(outputDirectory, geodatabaseName):
+    import arcpy
     
     # Construct the full path for the new geodatabase
     gdbPath = f"{outputDirectory}/{geodatabaseName}.gdb"
@@ -19,62 +30,30 @@ def createGeodatabase(outputDirectory, geodatabaseName):
 
     return gdbPath
 
-def importCSVIntoGeodatabase(csvFile, geodatabase):
+##Imports the CSV as the BaseInfo table; the AFSC literals are parsed once on the way in by afscData.loadBaseColumns,
+##so the table is written clean in one operation and never rewritten. Pass columns when they are already loaded.
+def importCSVIntoGeodatabase(csvFile, geodatabase, overwrite=False, columns=None):
+    import arcpy
+    ##workspace has to be set before checking for the table, otherwise Exists looks in the wrong place
+    arcpy.env.workspace = geodatabase
+    ##replaces the table when the CSV changed since it was imported
+    if overwrite and arcpy.Exists("BaseInfo"):
+        arcpy.Delete_management("BaseInfo")
+        stageStats.record(tablesDeleted=1)
+        print("Existing table 'BaseInfo' was deleted.")
     ##moves on if table is already created
     if arcpy.Exists("BaseInfo"):
         print(f"File already imported: {csvFile}")
         importedCSVPath = "BaseInfo"
     else:
         #import CSV
-        importedCSVPath = arcpy.TableToTable_conversion(csvFile, geodatabase, "BaseInfo")
+        if columns is None:
+            columns = afscData.loadBaseColumns(csvFile)
+        importedCSVPath = afscData.writeBaseTable(columns, geodatabase)
         print(f"CSV File: {importedCSVPath}, imported into Geodatabase")
     
     return importedCSVPath
 
-def cleanCSVinGeodatabase(table_path):
-    ##Use an UpdateCursor to modify the AFSC field
-    with arcpy.da.UpdateCursor(table_path, ["AFSC"]) as cursor:
-        for row in cursor:
-            if row[0].startswith('[') and row[0].endswith(']'):
-                # Clean the AFSC field by removing unwanted characters
-                clean_afsc = row[0].replace('[', '').replace(']', '').replace("'", "").strip()
-                clean_afsc = clean_afsc.replace(" ", "")
-                #Ensure clean formatting as a comma-separated string
-                row[0] = ', '.join(clean_afsc.split(', '))
-                cursor.updateRow(row)
-
-##Builds a dictionary mapping base names to a list of AFSCs as a list contataining a string
-def buildBaseDict(importedCSVPath, geodatabase):
-    ##uses table mported into geodatabase
-    # Set the environment workspace (assuming the table is in a geodatabase)
-    arcpy.env.workspace = geodatabase
-
-    # Name of your table
-    tableName = importedCSVPath
-    # Fields in the table: Base, Latitude, Longitude, AFSC
-    fields = ['Base', 'Latitude', 'Longitude', 'AFSC']
-
-    # Initialize an empty dictionary to store base data
-    baseDict = {}
-
-    # Create a search cursor to iterate over the rows in the table
-    with arcpy.da.SearchCursor(tableName, fields) as cursor:
-        for row in cursor:
-            base = row[0]
-            lat = row[1]
-            lon = row[2]
-            afsc = row[3]
-
-            # Check if the base is already in the dictionary
-            if base not in baseDict:
-                baseDict[base] = {'Location': {'Latitude': lat, 'Longitude': lon}, 'AFSC': [afsc]}
-            else:
-                # Add the AFSC to the list if it's not already included
-                if afsc not in baseDict[base]['AFSC']:
-                    baseDict[base]['AFSC'].append(afsc)
-            
-    return baseDict
-
 ##Builds a dictionary mapping AFSC codes to a list of bases where the AFSC is present.
 def buildAFSCDict(baseData):
     ##imports previously created base Dict
@@ -82,16 +61,11 @@ def buildAFSCDict(baseData):
 
     # Iterate over each base in the provided dictionary
     for base, info in baseData.items():
-        # Extract the single string from the 'AFSC' list and split it into individual AFSC codes
-        if info['AFSC']:  # Check if there's an AFSC entry
-            afsc_list = info['AFSC'][0].split(',')  # Split the string on commas
-
-            for afsc in afsc_list:
-                clean_afsc = afsc.strip()
-                # Clean up whitespace around the AFSC codes
-                if clean_afsc not in afsc_dict:
-                    afsc_dict[clean_afsc] = []
-                afsc_dict[clean_afsc].append(base)
+        # The AFSCs were parsed into codes at import, so they are used as they are
+        for afsc in info['AFSC']:
+            if afsc not in afsc_dict:
+                afsc_dict[afsc] = []
+            afsc_dict[afsc].append(base)
 
     # Convert lists of bases to comma-separated strings
     ##for afsc in afsc_dict:
@@ -100,7 +74,10 @@ def buildAFSCDict(baseData):
     return afsc_dict
 
 ##Updates a table by adding a field that stores the count of AFSCs for each base, using counts derived from a 'baseInfo' table.
-def addAFSCCount(baseInfoTable, geodatabase, identifierField, countField='AFSC_Count'):
+##The counts are committed in one bulk operation by writer, an arcpy ExtendTable writer unless another is passed in
+##With baseDict the counts come from the AFSC tuples parsed at import and the table is not read at all
+def addAFSCCount(baseInfoTable, geodatabase, identifierField, countField='AFSC_Count', writer=None, baseDict=None):
+    import arcpy
     
     # Set the workspace to the specified geodatabase
     arcpy.env.workspace = geodatabase
@@ -108,136 +85,112 @@ def addAFSCCount(baseInfoTable, geodatabase, identifierField, countField='AFSC_C
     # Ensure that baseInfoTable exists 
     if not arcpy.Exists(baseInfoTable):
         raise FileNotFoundError(f"The specified table '{baseInfoTable}' does not exist in the geodatabase.")
-
-    # add a field to base info table for the count
-    fieldNames = [field.name for field in arcpy.ListFields(baseInfoTable)]
-    if countField not in fieldNames:
-        arcpy.AddField_management(baseInfoTable, countField, "LONG")
-        print(f"Field '{countField}' base info table.")
-    else:
-        print(f"Field '{countField}' already exists in base Info Table.")
+    if writer is None:
+        writer = bulkWriters.ArcpyColumnWriter(geodatabase)
 
     # Create a dictionary from the baseInfoTable with base identifier as keys and AFSC count as values
     inputDict = {}
-    with arcpy.da.SearchCursor(baseInfoTable, [identifierField, 'AFSC']) as cursor:
-        for row in cursor:
-            base_identifier = row[0]
-            afscs = row[1].split(',') if row[1] else []
-            inputDict[base_identifier] = len(set(afscs))  # Count unique AFSCs to avoid duplicates using set
-    # Update the count field in the shapefile based on the AFSC counts in the dictionary using update cursor
-    with arcpy.da.UpdateCursor(baseInfoTable, ['base', countField]) as cursor:
-        for row in cursor:
-            base_identifier = row[0]
-            if base_identifier in inputDict:
-                row[1] = inputDict[base_identifier]  # Set the AFSC count
-                cursor.updateRow(row)
+    if baseDict is not None:
+        for base_identifier, info in baseDict.items():
+            inputDict[base_identifier] = len(info['AFSC'])  # parsed AFSC tuples hold no duplicates
+    else:
+        with stageStats.counted(arcpy.da.SearchCursor(baseInfoTable, [identifierField, 'AFSC'])) as cursor:
+            for row in cursor:
+                base_identifier = row[0]
+                inputDict[base_identifier] = len(afscData.parseAFSC(row[1] or ''))
+    # Write the whole count column in one operation, the writer adds the field if it is missing
+    rowsWritten = writer.writeColumn(baseInfoTable, identifierField, countField, inputDict, "LONG")
 
-    print("Count field updated based on AFSC data from the baseInfo table.")
+    print(f"Count field updated for {rowsWritten} bases based on AFSC data from the baseInfo table.")
+    return rowsWritten
 
 ##Calculates the standard distance for each AFSC based on base locations extracted from a shapefile and updates an existing table in the geodatabase with these distances.
-def standardDistance(inputDict, geodatabase, tableName, baseTable):
+##The mean center, weighted center and standard deviational ellipse of every AFSC are computed in the same batch and written alongside.
+def standardDistance(inputDict, geodatabase, tableName, baseTable, writer=None, weights=None):
+    import arcpy
 
     arcpy.env.workspace = geodatabase
+    if writer is None:
+        writer = bulkWriters.ArcpyColumnWriter(geodatabase)
 
-    # Check if the table exists; if it doesn't, print a message and return
+    # Check if the table exists; if it doesn't, print a message and create it
     if not arcpy.Exists(tableName):
         print(f"Table '{tableName}' does not exist in the geodatabase. Creating a new table.")
         arcpy.CreateTable_management(geodatabase, tableName)
+        stageStats.record(tablesCreated=1)
         arcpy.AddField_management(tableName, "AFSC", "TEXT")
-        arcpy.AddField_management("StandardDistance", "DOUBLE")
-    else:
-        arcpy.AddField_management(tableName, "StandardDistance", "DOUBLE")
-        print(f"Table '{tableName}' does exists in the geodatabase. Adding StandardDistance.")
     # Load shapefile
     base_coordinates = {}
     ##find coordinates for each base
     search = ["Base","Latitude","Longitude"]
-    with arcpy.da.SearchCursor(baseTable, search) as cursor:
+    with stageStats.counted(arcpy.da.SearchCursor(baseTable, search)) as cursor:
         for row in cursor:
             base = row[0]
             base_coordinates[row[0]] = [row[1], row[2]]  # Map base name to coordinates
-    fields = ["AFSC", "StandardDistance"]
-    # Calculate standard distance for each AFSC
-    afsc_to_distance = {}
-    for afsc, bases in inputDict.items():
-        coordinates = []
-        for base_name in bases:
-            if base_name in base_coordinates:
-                coordinates.append(base_coordinates[base_name])
-        
-        if not coordinates:
-            print(f"No valid coordinates found for AFSC {afsc}. Skipping.")
-            continue
-        
-        # Calculate centroid
-        centroid_x = sum(coord[0] for coord in coordinates) / len(coordinates)
-        centroid_y = sum(coord[1] for coord in coordinates) / len(coordinates)
-        
-        # Calculate standard distance
-        sum_squared_distances = sum(math.sqrt((coord[0] - centroid_x) ** 2 + (coord[1] - centroid_y) ** 2) ** 2
-                                    for coord in coordinates)
-        standard_distance = math.sqrt(sum_squared_distances / len(coordinates))
-        afsc_to_distance[afsc] = standard_distance
-    # Update the table with calculated standard distances
-    with arcpy.da.UpdateCursor(tableName, fields) as cursor:
-        for row in cursor:
-            afsc = row[0]
-            if afsc in afsc_to_distance:
-                row[1] = afsc_to_distance[afsc]
-                cursor.updateRow(row)
-            else:
-                print(f"AFSC {afsc} not found in the input dictionary. No distance calculated.")
-
-    print("Updated the table with standard distances.")
+    # Calculate the centers, standard distance and ellipse of every AFSC at once with a base x AFSC incidence matrix
+    baseNames = list(base_coordinates.keys())
+    latitude = np.array([base_coordinates[base][0] for base in baseNames], dtype=np.float64)
+    longitude = np.array([base_coordinates[base][1] for base in baseNames], dtype=np.float64)
+    incidence, afscCodes = afscData.buildIncidence(inputDict, baseNames)
+    ##weights maps base -> weight (e.g. billets), by default each base is weighted by its number of AFSCs
+    if weights is not None:
+        weights = np.array([weights.get(base, 0.0) for base in baseNames], dtype=np.float64)
+    stats = afscDispersion.batchDispersion(incidence, latitude, longitude, weights)
+    rows = afscDispersion.dispersionRows(afscCodes, stats)
+    # Write every dispersion field in one operation, the writer adds the fields if they are missing
+    rowsWritten = writer.writeColumns(tableName, "AFSC", afscDispersion.dispersionFields, rows)
+
+    print(f"Updated the table with {rowsWritten} standard distances and ellipses.")
     return tableName
 
-##Creates Point Shapefile from baseInfoTable
-def createPointShapeFile(tableName, shapeName, geodatabase, mappingVar):
+##Creates an empty point feature class with the fields for the mapping type and returns its name and fields
+def createPointFeatureClass(shapeName, geodatabase, mappingVar):
+    import arcpy
     arcpy.env.workspace = geodatabase
     # Name of the input table
     pointShapeFile = f"{shapeName}points"
     # Path to the output feature class
     if arcpy.Exists(pointShapeFile):
         arcpy.Delete_management(pointShapeFile)
+        stageStats.record(tablesDeleted=1)
         print(f"Existing shapeFile '{pointShapeFile}' was deleted.")
     # Set the spatial reference using a well-known ID (WGS 1984)
     spatial_reference = arcpy.SpatialReference(4326)  # WGS 1984
 
     # Create an empty Point feature class
     arcpy.management.CreateFeatureclass(arcpy.env.workspace, pointShapeFile, "POINT", "", "", "", spatial_reference)
+    stageStats.record(tablesCreated=1)
 
     # Add fields to store the latitude, longitude, and other details
-    
-    ##Creates shapefile for bases that includes the number of AFSCs at each base
-    if mappingVar == "AFSCCount":
-        arcpy.management.AddField(pointShapeFile, "AFSCCount", "DOUBLE")
-        insertFields = ["Base", "Latitude", "Longitude", "AFSCCount", "SHAPE@XY"]
-        searchFields = ["Base", "Latitude", "Longitude", "AFSCCount"]
-        arcpy.management.AddField(pointShapeFile, "Base", "TEXT")
-        arcpy.management.AddField(pointShapeFile, "Latitude", "DOUBLE")
-        arcpy.management.AddField(pointShapeFile, "Longitude", "DOUBLE")
-        arcpy.management.AddField(pointShapeFile, "AFSCCount", "DOUBLE")
-    
-    ##Creates a shapefile for a user selected base that lists AFSCs at each base
-    elif mappingVar == "Base":
-        insertFields = ["Base", "Latitude", "Longitude", "AFSC", "SHAPE@XY"]
-        searchFields = ["Base", "Latitude", "Longitude", "AFSC"]
-        arcpy.management.AddField(pointShapeFile, "Base", "TEXT")
-        arcpy.management.AddField(pointShapeFile, "Latitude", "DOUBLE")
-        arcpy.management.AddField(pointShapeFile, "Longitude", "DOUBLE")
-        arcpy.management.AddField(pointShapeFile, "AFSC", "TEXT")
-    
-    ##Creates a shapefile for a user slected AFSC that includes points for every base for that AFSC
-    elif mappingVar == "AFSC":
-        insertFields = ["Base", "Latitude", "Longitude", "SHAPE@XY"]
-        searchFields = ["Base", "Latitude", "Longitude"]
-        arcpy.management.AddField(pointShapeFile, "Base", "TEXT")
-        arcpy.management.AddField(pointShapeFile, "Latitude", "DOUBLE")
-        arcpy.management.AddField(pointShapeFile, "Longitude", "DOUBLE")
+    ##the schema per mapping type (AFSCCount, Base or AFSC) is shared with the arcpy-free writers in vectorWriters
+    searchFields = [name for name, fieldType in vectorWriters.mappingFields[mappingVar]]
+    insertFields = searchFields + ["SHAPE@XY"]
+    for name, fieldType in vectorWriters.mappingFields[mappingVar]:
+        arcpy.management.AddField(pointShapeFile, name, fieldType)
+    return pointShapeFile, insertFields, searchFields
+
+##Writes point rows in the afscData.pointRows layout, the fields then the (lon, lat) point, with one InsertCursor
+def writePointRows(pointShapeFile, insertFields, rows):
+    import arcpy
+    with stageStats.counted(arcpy.da.InsertCursor(pointShapeFile, insertFields)) as insert_cursor:
+        for row in rows:
+            lon, lat = row[-1]
+            # Ensure that the coordinates are valid
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                insert_cursor.insertRow(list(row))
+            else:
+                print(f"Skipped invalid coordinates for {row[0]}: Latitude {lat}, Longitude {lon}")
+    print(f"ShapeFile '{pointShapeFile}' was created.")
+    return pointShapeFile
+
+##Creates Point Shapefile from baseInfoTable
+def createPointShapeFile(tableName, shapeName, geodatabase, mappingVar):
+    import arcpy
+    pointShapeFile, insertFields, searchFields = createPointFeatureClass(shapeName, geodatabase, mappingVar)
     ## Use an InsertCursor to create new points and populate the feature class
     ## Use a search cursor to parse through designated serach fields to populate shapefile fields
-    with arcpy.da.SearchCursor(tableName, searchFields) as search_cursor, \
-         arcpy.da.InsertCursor(pointShapeFile, insertFields) as insert_cursor:
+    with stageStats.counted(arcpy.da.SearchCursor(tableName, searchFields)) as search_cursor, \
+         stageStats.counted(arcpy.da.InsertCursor(pointShapeFile, insertFields)) as insert_cursor:
         if searchFields == ["Base", "Latitude", "Longitude", "AFSCCount"]:
             for base_name, lat, lon, count in search_cursor:
                 # Ensure that the coordinates are valid
@@ -268,6 +221,7 @@ def createPointShapeFile(tableName, shapeName, geodatabase, mappingVar):
 
 ## Table creation function for multiple table types
 def tableMaker (baseTable, afscDict, tableName, geodatabase, tableType):
+    import arcpy
     
     arcpy.env.workspace = geodatabase
     ##creates specific name for AFSC table
@@ -283,10 +237,12 @@ def tableMaker (baseTable, afscDict, tableName, geodatabase, tableType):
     ##delete shapefile if exists    
     if arcpy.Exists(tablePath):
         arcpy.Delete_management(tablePath)
+        stageStats.record(tablesDeleted=1)
         print(f"Existing table '{tablePath}' was deleted.")
     
     # Create the table
     arcpy.CreateTable_management(geodatabase, tablePath)
+    stageStats.record(tablesCreated=1)
     print(f"New table '{tablePath}' created in the geodatabase.")
     ##Creates a table for a selected base
     if tableType == "selectedBaseTable":
@@ -296,8 +252,8 @@ def tableMaker (baseTable, afscDict, tableName, geodatabase, tableType):
         arcpy.AddField_management(tablePath, "AFSC", "TEXT")
         searchFields =  ["Base", "Latitude", "Longitude", "AFSC"]
         insertFields = ["Base", "Latitude", "Longitude", "AFSC"]
-        with arcpy.da.SearchCursor(baseTable, searchFields) as search_cursor, \
-             arcpy.da.InsertCursor(tablePath, insertFields) as insert_cursor:
+        with stageStats.counted(arcpy.da.SearchCursor(baseTable, searchFields)) as search_cursor, \
+             stageStats.counted(arcpy.da.InsertCursor(tablePath, insertFields)) as insert_cursor:
             for baseName, lat, lon, afsc in search_cursor:
                 if baseName == tableName:
                     row = [baseName, lat, lon, afsc]  # Prepare row data
@@ -311,8 +267,8 @@ def tableMaker (baseTable, afscDict, tableName, geodatabase, tableType):
         arcpy.AddField_management(tablePath, "Longitude", "DOUBLE")
         searchFields =  ["Base", "Latitude", "Longitude"]
         insertFields = ["Base", "Latitude", "Longitude"]
-        with arcpy.da.SearchCursor(baseTable, searchFields) as search_cursor, \
-             arcpy.da.InsertCursor(tablePath, insertFields) as insert_cursor:
+        with stageStats.counted(arcpy.da.SearchCursor(baseTable, searchFields)) as search_cursor, \
+             stageStats.counted(arcpy.da.InsertCursor(tablePath, insertFields)) as insert_cursor:
             for baseName, lat, lon in search_cursor:
                 if baseName in bases:
                     row = [baseName, lat, lon]  # Prepare row data
@@ -321,82 +277,237 @@ def tableMaker (baseTable, afscDict, tableName, geodatabase, tableType):
     elif tableType == "AFSCTable":
         arcpy.AddField_management(tableName, "AFSC", "TEXT", field_length=100)
         fields = ["AFSC"]
-        with arcpy.da.InsertCursor(tableName, fields) as cursor:
+        with stageStats.counted(arcpy.da.InsertCursor(tableName, fields)) as cursor:
             for afsc in afscDict.keys():
                 cursor.insertRow([afsc])
 
     return tablePath 
 
-##main data draw and creation function creates geodatabase, main table, cleans the imported table, builds dicts and does calculations
-def dataMan(folder,csvPath, geodatabaseName):
+##main data draw and creation function creates geodatabase, main table, builds dicts and does calculations
+##the CSV is read and its AFSC literals parsed once in the import stage, every later stage uses the parsed columns
+##backend "columnar" reads the CSV once with afscData and writes the finished tables instead of running a cursor per stage
+##finished stages are recorded in a manifest keyed on the CSV hash, so reruns on unchanged inputs skip them
+##as long as the tables they recorded are still in the geodatabase
+dataManStages = ["import", "dicts", "afscTable", "afscCount"]
+
+##Checks that the geodatabase and every table recorded in the manifest outputs still exist
+def recordedTablesExist(outputs):
+    import arcpy
+    geodatabase = outputs.get('geodatabase')
+    if not geodatabase or not arcpy.Exists(geodatabase):
+        return False
+    arcpy.env.workspace = geodatabase
+    return all(arcpy.Exists(outputs[table]) for table in ('baseTable', 'afscTable') if table in outputs)
+
+##statsPath writes the per-stage timing and I/O counters of the run to that JSON file
+def dataMan(folder,csvPath, geodatabaseName, backend="arcpy", statsPath=None):
+    with stageStats.recording(statsPath):
+        return runDataMan(folder, csvPath, geodatabaseName, backend)
+
+@stageStats.timedStage("dataMan")
+def runDataMan(folder, csvPath, geodatabaseName, backend="arcpy"):
+    manifest = stageManifest.loadManifest(stageManifest.manifestPath(folder, geodatabaseName),
+                                          stageManifest.runKey(csvPath, {'geodatabaseName': geodatabaseName, 'backend': backend, 'version': 3}))
+    geodatabase = f"{folder}/{geodatabaseName}.gdb"
+    stages = ["columnar"] if backend == "columnar" else dataManStages
+    ##a missing, half written or edited geodatabase invalidates every recorded stage
+    if manifest['stages'] and not recordedTablesExist(manifest['outputs']):
+        print("Recorded dataMan tables are missing from the geodatabase. Rebuilding all stages.")
+        manifest['stages'] = []
+    if stageManifest.allStagesDone(manifest, stages):
+        print("Inputs unchanged since the last run. Using recorded dataMan results.")
+        outputs = manifest['outputs']
+        return (outputs['geodatabase'], outputs['baseTable'], outputs['afscTable'], outputs['afscDict'],
+                afscData.restoreBaseDict(outputs['baseDict']))
+
+    if backend == "columnar":
+        with stageStats.stage("columnar"):
+            result = afscData.runEngine(csvPath, folder, geodatabaseName)
+        afscIndex.fromBaseDict(result['baseDict']).save(afscIndex.indexPath(result['geodatabase']))
+        stageManifest.recordStage(manifest, "columnar", geodatabase=result['geodatabase'], baseTable=result['baseTable'],
+                                  afscTable=result['afscTable'], afscDict=result['afscDict'], baseDict=result['baseDict'])
+        return result['geodatabase'], result['baseTable'], result['afscTable'], result['afscDict'], result['baseDict']
+
     geodatabase = createGeodatabase(folder, geodatabaseName)
-    baseTable = importCSVIntoGeodatabase(csvPath, geodatabase)
-    cleanCSVinGeodatabase(baseTable)
-    baseDict = buildBaseDict(baseTable, geodatabase)
-    afscDict = buildAFSCDict(baseDict)
-    afscTable = tableMaker(baseTable, afscDict, "AFSCTable", geodatabase, "AFSCTable")
-    standardDistance(afscDict, geodatabase, afscTable, baseTable)
-    addAFSCCount(baseTable, geodatabase, "Base", countField='AFSCCount')
+    columns = None
+    if stageManifest.stageDone(manifest, "import"):
+        baseTable = manifest['outputs']['baseTable']
+    else:
+        with stageStats.stage("import"):
+            columns = afscData.loadBaseColumns(csvPath)
+            baseTable = importCSVIntoGeodatabase(csvPath, geodatabase, overwrite=True, columns=columns)
+        stageManifest.recordStage(manifest, "import", geodatabase=geodatabase, baseTable=baseTable)
+    if stageManifest.stageDone(manifest, "dicts"):
+        baseDict = afscData.restoreBaseDict(manifest['outputs']['baseDict'])
+        afscDict = manifest['outputs']['afscDict']
+    else:
+        with stageStats.stage("dicts"):
+            if columns is None:
+                columns = afscData.loadBaseColumns(csvPath)
+            baseDict = afscData.buildBaseDict(columns)
+            afscDict = buildAFSCDict(baseDict)
+        afscIndex.fromBaseDict(baseDict).save(afscIndex.indexPath(geodatabase))
+        stageManifest.recordStage(manifest, "dicts", baseDict=baseDict, afscDict=afscDict)
+    if stageManifest.stageDone(manifest, "afscTable"):
+        afscTable = manifest['outputs']['afscTable']
+    else:
+        with stageStats.stage("afscTable"):
+            afscTable = tableMaker(baseTable, afscDict, "AFSCTable", geodatabase, "AFSCTable")
+        with stageStats.stage("standardDistance"):
+            standardDistance(afscDict, geodatabase, afscTable, baseTable)
+        stageManifest.recordStage(manifest, "afscTable", afscTable=afscTable)
+    if not stageManifest.stageDone(manifest, "afscCount"):
+        with stageStats.stage("afscCount"):
+            addAFSCCount(baseTable, geodatabase, "Base", countField='AFSCCount', baseDict=baseDict)
+        stageManifest.recordStage(manifest, "afscCount")
     return geodatabase, baseTable, afscTable, afscDict, baseDict
 
 ##function that creates an overall shapefile for all bases
+@stageStats.timedStage("overallMapping")
 def overallMapping (geodatabase, baseTable, baseDict):
     shapeFile = createPointShapeFile(baseTable, "baseInfo", geodatabase, "AFSCCount")
     print ("Overall Mapping Shapefile Created")
     return shapeFile
 
 ##Function that allows the user to enter a base that produces a point shapefile for the selected base
-def baseMapping (geodatabase, baseTable, afscTable, afscDict, baseDict, selectedBase):
-    ##call table maker function to create a table for individual base selected
-    selectedBaseTable = tableMaker(baseTable, afscDict, selectedBase, geodatabase, 'selectedBaseTable')
-    shapeFile = createPointShapeFile(selectedBaseTable,selectedBaseTable, geodatabase, "Base")
-    ##deletes intermediate table created for shapefile creation
-    if arcpy.Exists(selectedBaseTable):
-        arcpy.Delete_management(selectedBaseTable)
-        print(f"Existing table '{selectedBaseTable}' was deleted.")
+##the selected rows stream from the in-memory AFSC index straight into the feature class, no intermediate table is made
+##rows already selected by the caller are written as they are
+@stageStats.timedStage("baseMapping")
+def baseMapping (geodatabase, baseTable, afscTable, afscDict, baseDict, selectedBase, index=None, rows=None):
+    if rows is None:
+        if index is None:
+            index = afscIndex.fromBaseDict(baseDict)
+        rows = index.selectionRows("Base", selectedBase)
+    selectedBaseName = ''.join(char for char in selectedBase if char.isalnum() or char in ['_', '-'])
+    pointShapeFile, insertFields, searchFields = createPointFeatureClass(selectedBaseName, geodatabase, "Base")
+    return writePointRows(pointShapeFile, insertFields, rows)
 
 ##Function that allows the user to select an AFSC that produces a point file representing all bases that AFSC is station at
-def AFSCMapping (geodatabase, baseTable, afscTable, afscDict, baseDict, selectedAFSC):
-    ##call table maker function to make an a tbale for the bases included in the afsc selected
-    selectedAFSCTable = tableMaker(baseTable, afscDict, selectedAFSC, geodatabase, 'selectedAFSCTable')
-    selectedAFSC = selectedAFSC.strip('\"')  # Remove potential double quotes
-    selectedAFSC = ''.join(char for char in selectedAFSC if char.isalnum())
-    ##Create shapefile
-    shapeFile = createPointShapeFile(selectedAFSCTable,selectedAFSCTable, geodatabase, "AFSC")
-    ##deletes intermediate table created for shapefile creation
-    if arcpy.Exists(selectedAFSCTable):
-        arcpy.Delete_management(selectedAFSCTable)
-        print(f"Existing table '{selectedAFSCTable}' was deleted.")
-
-def runForAllMapping():
+##the bases of the AFSC stream from the in-memory AFSC index straight into the feature class, no intermediate table is made
+##rows already selected by the caller are written as they are
+@stageStats.timedStage("AFSCMapping")
+def AFSCMapping (geodatabase, baseTable, afscTable, afscDict, baseDict, selectedAFSC, index=None, rows=None):
+    if rows is None:
+        if index is None:
+            index = afscIndex.fromBaseDict(baseDict)
+        rows = index.selectionRows("AFSC", selectedAFSC)
+    selectedAFSCName = "AFSC_" + ''.join(char for char in selectedAFSC.strip('\"') if char.isalnum())
+    pointShapeFile, insertFields, searchFields = createPointFeatureClass(selectedAFSCName, geodatabase, "AFSC")
+    return writePointRows(pointShapeFile, insertFields, rows)
+
+##Long lived mapping session that runs dataMan once and holds the geodatabase, tables, dicts and AFSC index
+##for every mapping mode, so one job does a single ingest no matter how many layers it produces
+##base and AFSC selections go through an LRU cache keyed on the data version, so repeated selections reuse their layer
+##with a statsPath every stage of the session is recorded and close() stops the recorder and saves the report there
+##used as a context manager the session is closed when the block ends
+class MappingSession:
+    def __init__(self, folder, csvPath, geodatabaseName, backend="arcpy", cacheSize=32, statsPath=None):
+        self.folder = folder
+        self.csvPath = csvPath
+        self.geodatabaseName = geodatabaseName
+        self.statsPath = statsPath
+        self.recorder = stageStats.startRecording() if statsPath else None
+        self.geodatabase, self.baseTable, self.afscTable, self.afscDict, self.baseDict = dataMan(folder, csvPath, geodatabaseName, backend)
+        self.index = afscIndex.loadOrBuildIndex(self.geodatabase, self.baseDict)
+        self.dataVersion = stageManifest.runKey(csvPath, {'geodatabaseName': geodatabaseName, 'backend': backend})
+        self.selections = selectionCache.SelectionCache(cacheSize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    ##Ends any open stage, stops the session's recorder and writes its report to statsPath, does nothing without one
+    def close(self):
+        if self.recorder is None:
+            return None
+        recorder = self.recorder
+        self.recorder = None
+        recorder.closeOpenStages()
+        if stageStats.activeRecorder is recorder:
+            stageStats.stopRecording()
+        print(f"Stage statistics written to {self.statsPath}")
+        return recorder.writeReport(self.statsPath)
+
+    def mapAll(self):
+        return overallMapping(self.geodatabase, self.baseTable, self.baseDict)
+
+    ##Returns the cached selection (rows and output path), building its layer with mapFunction on a miss
+    def selection(self, mappingVar, selected, mapFunction):
+        import arcpy
+        arcpy.env.workspace = self.geodatabase
+        entry = self.selections.get(mappingVar, selected, self.dataVersion, lambda entry: arcpy.Exists(entry.outputPath))
+        if entry is not None:
+            print(f"Reusing '{entry.outputPath}' for {selected}.")
+            return entry
+        ##the rows are selected once, written to the layer and kept in the cache entry
+        rows = self.index.selectionRows(mappingVar, selected)
+        outputPath = mapFunction(self.geodatabase, self.baseTable, self.afscTable, self.afscDict, self.baseDict, selected, self.index, rows)
+        return self.selections.put(mappingVar, selected, self.dataVersion, rows, outputPath)
+
+    def mapBase(self, selectedBase):
+        return self.selection("Base", selectedBase, baseMapping).outputPath
+
+    def mapAFSC(self, selectedAFSC):
+        return self.selection("AFSC", selectedAFSC, AFSCMapping).outputPath
+
+    def mapAllAFSCs(self, workers=1):
+        return allAFSCMapping(self.geodatabase, self.baseTable, self.afscTable, self.afscDict, self.baseDict, workers)
+
+    ##Writes the top k co-located AFSCs and most similar bases next to the geodatabase
+    def analyze(self, k=10):
+        return afscAnalytics.writeAnalytics(afscAnalytics.fromBaseDict(self.baseDict, self.afscDict), self.folder, k)
+
+    ##Non interactive batch mode, maps every listed base and AFSC and optionally the overall and per AFSC layers
+    def runBatch(self, bases=(), afscs=(), overall=False, allAFSCs=False, workers=1):
+        outputs = {'overall': None, 'bases': {}, 'afscs': {}, 'allAFSCs': []}
+        if overall:
+            outputs['overall'] = self.mapAll()
+        for selectedBase in bases:
+            if selectedBase in self.index.baseToAFSCs:
+                outputs['bases'][selectedBase] = self.mapBase(selectedBase)
+            else:
+                print(f"invalid base skipped: {selectedBase}")
+        for selectedAFSC in afscs:
+            if selectedAFSC in self.afscDict:
+                outputs['afscs'][selectedAFSC] = self.mapAFSC(selectedAFSC)
+            else:
+                print(f"invalid AFSC skipped: {selectedAFSC}")
+        if allAFSCs:
+            outputs['allAFSCs'] = self.mapAllAFSCs(workers)
+        return outputs
+
+##Asks the user for the geodatabase folder, CSV and geodatabase name once and opens a session
+def promptSession():
     ##User input for file folder for the storage of geodatabase and subsiquent files created by program
     folder = input('enter folder for geodatabase to be stored in: ')
     ##User input for file path for csv provided with program
     csvPath = input('enter CSV path: ')
     ##User name for geodatabase, can be an exisiting geodatabase or one created by the program and reused
     geodatabaseName = input('enter geodatabase name: ')
+    ##optional JSON file for the per-stage timing and I/O counters of the run
+    statsPath = input('enter path for stage statistics JSON (blank to skip): ') or None
     ##call dataman fuction to get geoprocessing started
-    geodatabase, baseTable, afscTable, afscDict, baseDict = dataMan(folder,csvPath, geodatabaseName)
-    overallMapping (geodatabase, baseTable, baseDict)
+    return MappingSession(folder, csvPath, geodatabaseName, statsPath=statsPath)
+
+def runForAllMapping(session=None):
+    ##prompts and runs dataMan only when no session is passed in
+    if session is None:
+        session = promptSession()
+    session.mapAll()
 
 ##Run Function for mapping a user entered Base from a list of Bases in data base
-def runForUserBaseMapping():
-    ##User input for file folder for the storage of geodatabase and subsiquent files created by program
-    folder = input('enter folder for geodatabase to be stored in: ')
-    ##User input for file path for csv provided with program
-    csvPath = input('enter CSV path: ')
-    ##User name for geodatabase, can be an exisiting geodatabase or one created by the program and reused
-    geodatabaseName = input('enter geodatabase name: ')
-    ##call dataman fuction to get geoprocessing started
-    geodatabase, baseTable, afscTable, afscDict, baseDict = dataMan(folder,csvPath, geodatabaseName)
+def runForUserBaseMapping(session=None):
+    ##prompts and runs dataMan only when no session is passed in
+    if session is None:
+        session = promptSession()
     baseNameList = []
-    ##Cursor to pull base names for listing to user
-    with arcpy.da.SearchCursor(baseTable, ["Base"]) as search_cursor:
-        for base in search_cursor:
-            base = base[0]
-            filteredBaseName = ''.join([char for char in base if char.isalpha() or char.isspace()])
-            baseNameList += [filteredBaseName]
-            print(filteredBaseName)
+    ##base names come from the saved AFSC index instead of another cursor over the base table
+    for base in session.index.baseToAFSCs.keys():
+        filteredBaseName = ''.join([char for char in base if char.isalpha() or char.isspace()])
+        baseNameList += [filteredBaseName]
+        print(filteredBaseName)
     selectedBase = ""
     ##User Input iteration that asks for input until stop statement is entered by user
     while selectedBase != "STOP":
@@ -404,27 +515,23 @@ def runForUserBaseMapping():
         selectedBase = input("enter one of the above bases of interest: ")
         if selectedBase == "STOP":
             print("User Base Mapping Stopped")
+            print(f"Selection cache: {session.selections.stats()}")
             return
         elif selectedBase in baseNameList:
-            baseMapping (geodatabase, baseTable, afscTable, afscDict, baseDict, selectedBase)
+            session.mapBase(selectedBase)
         else: 
             print("invalid entry")
             print ("To stop iteration enter: STOP")
             input("enter one of the above bases of interest: ")
 
 ##Run Function for mapping a user entered AFSC from a list of AFSCs in data base
-def runForUserAFSCMapping():
-    ##User input for file folder for the storage of geodatabase and subsiquent files created by program
-    folder = input('enter folder for geodatabase to be stored in: ')
-    ##User input for file path for csv provided with program
-    csvPath = input('enter CSV path: ')
-    ##User name for geodatabase, can be an exisiting geodatabase or one created by the program and reused
-    geodatabaseName = input('enter geodatabase name: ')
-    ##call dataman fuction to get geoprocessing started
-    geodatabase, baseTable, afscTable, afscDict, baseDict = dataMan(folder,csvPath, geodatabaseName)
+def runForUserAFSCMapping(session=None):
+    ##prompts and runs dataMan only when no session is passed in
+    if session is None:
+        session = promptSession()
     afscList = []
     ## for loop to pulls afscs from afsc dist for lsiting to the user
-    for afsc in afscDict.keys():
+    for afsc in session.afscDict.keys():
         afscList += [afsc]
         print(afsc)
     selectedAFSC = ""
@@ -434,43 +541,101 @@ def runForUserAFSCMapping():
         selectedAFSC = input("enter one of the above AFSCs of interest: ")
         if selectedAFSC == "STOP":
             print("User AFSC Mapping Stopped")
+            print(f"Selection cache: {session.selections.stats()}")
             return
         elif selectedAFSC in afscList:
-            AFSCMapping (geodatabase, baseTable, afscTable, afscDict, baseDict, selectedAFSC)
+            session.mapAFSC(selectedAFSC)
         else: 
             print("invalid entry")
             print ("To stop iteration enter: STOP")
             input("enter one of the above AFSCs of interest: ")    
 
+##Worker for the parallel export, writes a chunk of AFSC point files into its own scratch geodatabase
+def exportAFSCChunk(scratchFolder, chunkIndex, chunk):
+    scratchGdb = createGeodatabase(scratchFolder, f"scratch{chunkIndex}")
+    shapeFiles = []
+    for selectedAFSCName, rows in chunk:
+        pointShapeFile, insertFields, searchFields = createPointFeatureClass(selectedAFSCName, scratchGdb, "AFSC")
+        shapeFiles.append(writePointRows(pointShapeFile, insertFields, rows))
+    return scratchGdb, shapeFiles
+
+##Writes the AFSC point files with a process pool, each worker into a separate scratch geodatabase,
+##then copies the finished feature classes into the destination geodatabase
+def parallelAFSCExport(geodatabase, namedBuckets, workers):
+    import arcpy
+    workers = min(workers, len(namedBuckets))
+    scratchFolder = tempfile.mkdtemp(prefix="afscExport", dir=os.path.dirname(geodatabase))
+    chunks = [namedBuckets[i::workers] for i in range(workers)]
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(exportAFSCChunk, [scratchFolder] * workers, range(workers), chunks))
+        ##collect every worker's output into the destination
+        arcpy.env.workspace = geodatabase
+        shapeFiles = []
+        for scratchGdb, chunkShapeFiles in results:
+            for pointShapeFile in chunkShapeFiles:
+                if arcpy.Exists(pointShapeFile):
+                    arcpy.Delete_management(pointShapeFile)
+                    stageStats.record(tablesDeleted=1)
+                arcpy.Copy_management(f"{scratchGdb}/{pointShapeFile}", f"{geodatabase}/{pointShapeFile}")
+                stageStats.record(tablesCreated=1)
+                shapeFiles.append(pointShapeFile)
+        print(f"Collected {len(shapeFiles)} AFSC shapefiles from {workers} workers into {geodatabase}")
+    finally:
+        shutil.rmtree(scratchFolder, ignore_errors=True)
+    return shapeFiles
+
 ##creates a sperate point file that includes the bases for every AFSC
-def allAFSCMapping (geodatabase, baseTable, afscTable, afscDict, baseDict):
-    for selectedAFSC in afscDict.keys():
-        selectedAFSCTable = tableMaker(baseTable, afscDict, selectedAFSC, geodatabase, 'selectedAFSCTable')
-        selectedAFSC = selectedAFSC.strip('\"')  # Remove potential double quotes
-        selectedAFSC = ''.join(char for char in selectedAFSC if char.isalnum())
-        shapeFile = createPointShapeFile(selectedAFSCTable,selectedAFSCTable, geodatabase, "AFSC")
+##one pass over the base table routes each row into a bucket per AFSC, then each bucket is written straight to its point file
+##workers above 1 spreads the point files over a process pool
+@stageStats.timedStage("allAFSCMapping")
+def allAFSCMapping (geodatabase, baseTable, afscTable, afscDict, baseDict, workers=1):
+    import arcpy
+    arcpy.env.workspace = geodatabase
+    ##invert the AFSC dict once so a base row can be routed to every AFSC stationed there
+    afscsForBase = {}
+    for afsc, bases in afscDict.items():
+        for base in set(bases):
+            afscsForBase.setdefault(base, []).append(afsc)
+    buckets = {afsc: [] for afsc in afscDict}
+    with stageStats.counted(arcpy.da.SearchCursor(baseTable, ["Base", "Latitude", "Longitude"])) as search_cursor:
+        for baseName, lat, lon in search_cursor:
+            for afsc in afscsForBase.get(baseName, ()):
+                buckets[afsc].append((baseName, lat, lon, (lon, lat)))
+    namedBuckets = [("AFSC_" + ''.join(char for char in selectedAFSC if char.isalnum()), rows)
+                    for selectedAFSC, rows in buckets.items()]
+    if workers > 1 and len(namedBuckets) > 1:
+        return parallelAFSCExport(geodatabase, namedBuckets, workers)
+    shapeFiles = []
+    for selectedAFSCName, rows in namedBuckets:
+        pointShapeFile, insertFields, searchFields = createPointFeatureClass(selectedAFSCName, geodatabase, "AFSC")
+        shapeFiles.append(writePointRows(pointShapeFile, insertFields, rows))
+    return shapeFiles
 
 ##Run Funtion to Produce an independent shapefile for every AFSC in original file
-def runForAllAFSCMapping():
-    ##User input for file folder for the storage of geodatabase and subsiquent files created by program
-    folder = input('enter folder for geodatabase to be stored in: ')
-    ##User input for file path for csv provided with program
-    csvPath = input('enter CSV path: ')
-    ##User name for geodatabase, can be an exisiting geodatabase or one created by the program and reused
-    geodatabaseName = input('enter geodatabase name: ')
-    ##call dataman fuction to get geoprocessing started
-    geodatabase, baseTable, afscTable, afscDict, baseDict = dataMan(folder,csvPath, geodatabaseName)
-    allAFSCMapping (geodatabase, baseTable, afscTable, afscDict, baseDict)
-
-##call to run the runForAllMapping function
-runForAllMapping()
-
-##call to run the runForUserBaseMapping function
-runForUserBaseMapping()
-
-##call to run the runForUserAFSCMapping function
-runForUserAFSCMapping ()
-
-##call to run the runForAllAFSCMapping function
-##Creates 40+ files do not run without good destination
-runForAllAFSCMapping()
+##workers sets how many processes write the point files, 1 keeps the export sequential
+def runForAllAFSCMapping(session=None, workers=1):
+    ##prompts and runs dataMan only when no session is passed in
+    if session is None:
+        session = promptSession()
+    session.mapAllAFSCs(workers)
+
+##runs are guarded so the export worker processes can import this file without starting the prompts
+if __name__ == '__main__':
+    ##one session is shared by all four runs so the folder, CSV and geodatabase are asked for and ingested once
+    ##closing it at the end of the block writes the stage statistics when a path was entered
+    with promptSession() as session:
+
+        ##call to run the runForAllMapping function
+        runForAllMapping(session)
+
+        ##call to run the runForUserBaseMapping function
+        runForUserBaseMapping(session)
+
+        ##call to run the runForUserAFSCMapping function
+        runForUserAFSCMapping (session)
+
+        ##call to run the runForAllAFSCMapping function
+        ##Creates 40+ files do not run without good destination
+        ##pass workers=os.cpu_count() to write them in parallel
+        runForAllAFSCMapping(session)
@@ -21,6 +21,14 @@ def hawkid():
 # geodatabase: The workspace geodatabase
 ###################################################################### 
 import arcpy
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import krigingEngine
+import rasterTiles
+import tableCheck
 def importCSVIntoGeodatabase(csvFile, geodatabase):
     importedCSVPath = arcpy.TableToTable_conversion(csvFile, geodatabase, "imported")
     return importedCSVPath
@@ -59,56 +67,126 @@ def importCSVIntoGeodatabase(csvFile, geodatabase):
 # 7- Clip the interpolated kriging raster, and delete the original kriging result
 #    after successful clipping. 
 #################################################################################################################### 
-## qulity check function: if there are non-numeric values they will be set to none
-def tableQualityCheck (inTable):
-    fields = arcpy.ListFields(inTable)
-    fieldNames = [field.name for field in fields]
-    # Open a up cursor to iterate through rows in the table
-    with arcpy.da.UpdateCursor(inTable, fieldNames) as cursor:
-        for row in cursor:
-            ##look through each value to change them if they are not a numeric variable such as a float that appears as a string
-            for i, value in enumerate(row):
-                
-                ##fixes some values that are listed incorrectly
-                if row[i] == 'M':
-                    row[i] = None
-                if row[i] != None:
-                    try:
-                        row[i] = float(row[i])
-                    except ValueError:
-                        pass
-            cursor.updateRow(row)
-
-def krigingFromPointCSV(inTable, valueField, xField, yField, inClipFc, workspace):
+## qulity check function: reads the CSV once, infers each column's type and coerces it with vectorized parsing,
+## missing tokens such as 'M' and non-numeric cells of numeric columns become null, then the checked columns are
+## imported with one NumPyArrayToTable call so the table is never rewritten row by row
+def importCheckedCSV(csvFile, geodatabase, missingTokens=tableCheck.defaultMissingTokens, tableName="imported"):
+    frame, report = tableCheck.checkCSV(csvFile, missingTokens)
+    tableCheck.printReport(report)
+    tablePath = f"{geodatabase}/{tableName}"
+    if arcpy.Exists(tablePath):
+        arcpy.Delete_management(tablePath)
+    arcpy.da.NumPyArrayToTable(tableCheck.toStructuredArray(frame), tablePath)
+    return tablePath
+
+##polygon rings of the clip feature class as (N, 2) arrays, used to skip output tiles outside it
+def clipRings(inClipFc):
+    rings = []
+    with arcpy.da.SearchCursor(inClipFc, ["SHAPE@"]) as cursor:
+        for (shape,) in cursor:
+            for part in shape:
+                ring = []
+                ##a None point separates the exterior ring from the interior rings of a part
+                for point in list(part) + [None]:
+                    if point is None:
+                        if ring:
+                            rings.append(np.array(ring))
+                        ring = []
+                    else:
+                        ring.append((point.X, point.Y))
+    return rings
+
+##kriges the projected points with the NumPy engine in krigingEngine into a tiled, memory-mapped float grid
+##in a scratch folder, tiles outside the clip polygon are skipped and tiles are spread over a process pool
+##the grid is copied into the workspace as outRaster and the scratch files are removed even if the copy fails
+##needs no Spatial Analyst license; the cell size defaults to the shorter side of the extent / 250 like Kriging_3d
+##model "idw" interpolates by inverse distance weighting instead, a quick-look map without fitting a variogram
+##cells outside inClipFc are masked while the grid is written, so the returned grid is already clipped
+def numpyKriging(pointsFc, valueField, outRaster, inClipFc, cellSize=None, model="best", workers=None):
+    points = arcpy.da.FeatureClassToNumPyArray(pointsFc, ["SHAPE@X", "SHAPE@Y", valueField], skip_nulls=True)
+    x = points["SHAPE@X"].astype(float)
+    y = points["SHAPE@Y"].astype(float)
+    z = points[valueField].astype(float)
+    if cellSize is None:
+        cellSize = min(x.max() - x.min(), y.max() - y.min()) / 250.0
+    if model == "idw":
+        kriging = krigingEngine.InverseDistanceWeighting(x, y, z)
+    else:
+        kriging = krigingEngine.OrdinaryKriging(x, y, z, model)
+    xMin, yMax, nRows, nCols = krigingEngine.gridExtent(x, y, cellSize)
+    scratchFolder = tempfile.mkdtemp(prefix="kriging", dir=arcpy.env.scratchFolder)
+    try:
+        gridPath = os.path.join(scratchFolder, f"{outRaster}.flt")
+        rasterTiles.interpolateTiled(kriging, gridPath, xMin, yMax, cellSize, nRows, nCols, clipRings(inClipFc), workers=workers)
+        arcpy.DefineProjection_management(gridPath, arcpy.Describe(pointsFc).spatialReference)
+        outRaster = arcpy.CopyRaster_management(gridPath, outRaster)
+    finally:
+        shutil.rmtree(scratchFolder, ignore_errors=True)
+    print(f"{kriging.model} model {kriging.params} interpolated {len(z)} points into {outRaster}")
+    return outRaster
+
+##leave-one-out cross-validation of every variogram model on the projected points, without building a raster
+##prints RMSE, mean error and standardized errors per model; model="cv" in krigingFromPointCSV kriges with the best one
+def krigingCrossValidation(pointsFc, valueField):
+    points = arcpy.da.FeatureClassToNumPyArray(pointsFc, ["SHAPE@X", "SHAPE@Y", valueField], skip_nulls=True)
+    x = points["SHAPE@X"].astype(float)
+    y = points["SHAPE@Y"].astype(float)
+    z = points[valueField].astype(float)
+    fits = krigingEngine.fitAllVariograms(*krigingEngine.empiricalVariogram(x, y, z))
+    results = krigingEngine.crossValidateModels(x, y, z, fits)
+    krigingEngine.printCrossValidation(results)
+    return results
+
+##engine "arcpy" uses Kriging_3d and the Spatial Analyst extension, engine "numpy" uses krigingEngine and needs neither
+##engine "idw" is the NumPy path with inverse distance weighting; both NumPy engines clip while interpolating
+def krigingFromPointCSV(inTable, valueField, xField, yField, inClipFc, workspace, engine="arcpy", cellSize=None, model="best",
+                        missingTokens=tableCheck.defaultMissingTokens):
     arcpy.env.workspace = workspace
     arcpy.env.overwriteOutput = True
-    ##call previous function to import table into Geodatabase
-    inTable = importCSVIntoGeodatabase(inTable, workspace)
-    
-    ##perform quality check on the imported table
-    tableQualityCheck (inTable)
+    ##import the table into the Geodatabase with its columns quality checked on the way in
+    inTable = importCheckedCSV(inTable, workspace, missingTokens)
     #generate input feature
     pointsFromInTable = arcpy.MakeXYEventLayer_management(inTable, xField, yField, "pointsFromInTable")
     
     #check if spatial analyist is availible 
-    if arcpy.CheckExtension("Spatial") == "Available":
-        arcpy.CheckOutExtension("Spatial")
-    else:
-        raise Exception("Spatial Analyst extension is not available.")
+    if engine == "arcpy":
+        if arcpy.CheckExtension("Spatial") == "Available":
+            arcpy.CheckOutExtension("Spatial")
+        else:
+            raise Exception("Spatial Analyst extension is not available.")
         
     ##project point class    
     pointsFromInTableProjected = arcpy.Project_management(pointsFromInTable, "pointsFromInTableProjected", inClipFc)
   
-    ##create krig with projected points 
-    krigingOut = arcpy.Kriging_3d(pointsFromInTableProjected, valueField, "krigingOut")
-    
-    ##clip krig
-    krigingClip = arcpy.Clip_management(krigingOut,"#","krigingClipped", inClipFc,  "None", "ClippingGeometry", "MAINTAIN_EXTENT")
+    ##create krig with projected points, the NumPy engines write it already clipped to inClipFc
+    if engine == "arcpy":
+        krigingOut = arcpy.Kriging_3d(pointsFromInTableProjected, valueField, "krigingOut")
+        ##clip krig
+        krigingClip = arcpy.Clip_management(krigingOut,"#","krigingClipped", inClipFc,  "None", "ClippingGeometry", "MAINTAIN_EXTENT")
+    else:
+        krigingOut = None
+        krigingClip = numpyKriging("pointsFromInTableProjected", valueField, "krigingClipped", inClipFc, cellSize,
+                                   "idw" if engine == "idw" else model)
 
     
     if arcpy.Exists(krigingClip):
-        arcpy.Delete_management(krigingOut)
+        if krigingOut is not None:
+            arcpy.Delete_management(krigingOut)
         arcpy.Delete_management(pointsFromInTable)
+    return krigingClip
+
+##times the arcpy, NumPy kriging and NumPy IDW engines on the same inputs, the arcpy run is skipped without a Spatial Analyst license
+def compareKrigingEngines(inTable, valueField, xField, yField, inClipFc, workspace, cellSize=None):
+    seconds = {}
+    for engine in ("arcpy", "numpy", "idw"):
+        if engine == "arcpy" and arcpy.CheckExtension("Spatial") != "Available":
+            print("Spatial Analyst extension is not available. Timing only the NumPy engines.")
+            continue
+        start = time.perf_counter()
+        krigingFromPointCSV(inTable, valueField, xField, yField, inClipFc, workspace, engine, cellSize)
+        seconds[engine] = time.perf_counter() - start
+        print(f"{engine} interpolation took {seconds[engine]:.2f} s")
+    return seconds
 
 ##run statement asking for user input and running main body of code
 def run():
@@ -119,9 +197,12 @@ def run():
     xField = input("enter name of field that will serve as x value for krig: ")
     yField = input("enter name of field that will serve as y value for krig: ")
     
-    krigingFromPointCSV(csvFile, valueField, xField, yField, inClipFc, geodatabase)
+    engine = input("enter kriging engine, arcpy, numpy or idw: ") or "arcpy"
+    
+    krigingFromPointCSV(csvFile, valueField, xField, yField, inClipFc, geodatabase, engine)
 
-run()            
+if __name__ == '__main__':
+    run()
 
 ######################################################################
 # MAKE NO CHANGES BEYOND THIS POINT.
@@ -0,0 +1,313 @@
+import argparse
+import os
+import time
+import numpy as np
+import scipy.linalg
+import scipy.optimize
+import scipy.spatial
+import rasterTiles
+import tableCheck
+
+##Ordinary kriging in NumPy, a license-free stand-in for arcpy.Kriging_3d in hw3.krigingFromPointCSV
+##1. the empirical semivariogram is binned from all point pairs, or from a random sample of pairs for large inputs
+##2. the spherical, exponential and Gaussian models are fitted to it by weighted least squares
+##3. every output cell is estimated from its k nearest observations, the small kriging systems of a whole batch
+##   of cells are stacked into one (batch, k + 1, k + 1) array and solved with a single np.linalg.solve call
+##4. leave-one-out cross-validation of a model comes from one LU factorization of the global kriging system
+##InverseDistanceWeighting shares the neighbour search as a cheaper interpolator for quick-look maps.
+##Coordinates are planar (projected) units; localProjection turns longitude/latitude into metres for quick runs.
+
+##Variogram models of the lag h with nugget, partial sill and (practical) range
+def spherical(h, nugget, psill, range_):
+    ratio = np.minimum(h / range_, 1.0)
+    return nugget + psill * ratio * (1.5 - 0.5 * ratio * ratio)
+
+def exponential(h, nugget, psill, range_):
+    return nugget + psill * (1.0 - np.exp(-3.0 * h / range_))
+
+def gaussian(h, nugget, psill, range_):
+    return nugget + psill * (1.0 - np.exp(-3.0 * (h / range_) ** 2))
+
+variogramModels = {"spherical": spherical, "exponential": exponential, "gaussian": gaussian}
+
+##Semivariance of a fitted model, zero at zero lag as kriging requires
+def semivariance(model, params, h):
+    return np.where(h > 0, variogramModels[model](h, *params), 0.0)
+
+##Equirectangular projection to metres around the centre of the points, good enough for state sized extents
+def localProjection(longitude, latitude):
+    longitude = np.asarray(longitude, dtype=np.float64)
+    latitude = np.asarray(latitude, dtype=np.float64)
+    lat0 = np.radians(np.mean(latitude))
+    metresPerDegree = 6371008.8 * np.pi / 180.0
+    return (longitude - np.mean(longitude)) * metresPerDegree * np.cos(lat0), (latitude - np.mean(latitude)) * metresPerDegree
+
+##Binned empirical semivariogram, returns (lag centres, semivariance, pair counts) for the non-empty bins
+##inputs with more than maxPairs pairs are sampled at random so 100k points do not need 5e9 pairs
+def empiricalVariogram(x, y, z, nLags=12, maxLag=None, maxPairs=1000000, seed=0):
+    n = len(z)
+    if n * (n - 1) // 2 <= maxPairs:
+        first, second = np.triu_indices(n, k=1)
+    else:
+        rng = np.random.default_rng(seed)
+        first = rng.integers(0, n, maxPairs)
+        second = rng.integers(0, n, maxPairs)
+        keep = first != second
+        first, second = first[keep], second[keep]
+    distances = np.hypot(x[first] - x[second], y[first] - y[second])
+    halfSquared = 0.5 * (z[first] - z[second]) ** 2
+    if maxLag is None:
+        maxLag = distances.max() / 2.0
+    inRange = distances <= maxLag
+    bins = np.minimum((distances[inRange] / maxLag * nLags).astype(np.int64), nLags - 1)
+    counts = np.bincount(bins, minlength=nLags)
+    sums = np.bincount(bins, weights=halfSquared[inRange], minlength=nLags)
+    lagSums = np.bincount(bins, weights=distances[inRange], minlength=nLags)
+    filled = counts > 0
+    return lagSums[filled] / counts[filled], sums[filled] / counts[filled], counts[filled]
+
+##Fits one model to the empirical variogram weighted by pair counts, returns (params, weighted squared error)
+def fitVariogram(lags, gamma, counts, model):
+    ##a small nugget floor keeps the kriging systems of smooth models such as the Gaussian from going singular
+    nuggetFloor = 1e-6 * max(gamma.max(), 1e-12)
+    start = [max(gamma.min(), 2.0 * nuggetFloor), max(gamma.max() - gamma.min(), 1e-12), max(lags.max() / 2.0, 1e-12)]
+    upper = [np.inf, np.inf, lags.max() * 10.0]
+    try:
+        params, covariance = scipy.optimize.curve_fit(variogramModels[model], lags, gamma, p0=start, sigma=1.0 / np.sqrt(counts),
+                                                      bounds=([nuggetFloor, 0.0, 1e-12], upper), maxfev=10000)
+    except (RuntimeError, ValueError):
+        print(f"Variogram fit for the {model} model did not converge. Using the starting values.")
+        params = np.array(start)
+    error = float(np.sum(counts * (variogramModels[model](lags, *params) - gamma) ** 2))
+    return tuple(float(value) for value in params), error
+
+##Fits every model and returns {model: (params, error)}
+def fitAllVariograms(lags, gamma, counts, models=None):
+    return {model: fitVariogram(lags, gamma, counts, model) for model in (models or variogramModels)}
+
+##Leave-one-out residuals of ordinary kriging from a single factorization of the global system A = [[G, 1], [1', 0]]
+##Leaving observation i out gives z_i - estimate_i = (A^-1 b)_i / (A^-1)_ii with b = [z, 0], and as G_ii = 0 the
+##kriging variance of that estimate is -1 / (A^-1)_ii, so all n held-out estimates cost one O(n^3) factorization
+##inputs above maxPoints are cross-validated on a random subset of that size
+def leaveOneOut(x, y, z, model, params, maxPoints=3000, seed=0):
+    if len(z) > maxPoints:
+        print(f"Cross-validating a random subset of {maxPoints} of the {len(z)} observations.")
+        rows = np.random.default_rng(seed).choice(len(z), maxPoints, replace=False)
+        x, y, z = x[rows], y[rows], z[rows]
+    n = len(z)
+    system = np.ones((n + 1, n + 1))
+    system[:n, :n] = semivariance(model, params, np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :]))
+    system[n, n] = 0.0
+    factor = scipy.linalg.lu_factor(system, check_finite=False)
+    weights = scipy.linalg.lu_solve(factor, np.append(z, 0.0), check_finite=False)
+    inverseDiagonal = np.diag(scipy.linalg.lu_solve(factor, np.eye(n + 1), check_finite=False))[:n]
+    errors = -weights[:n] / inverseDiagonal
+    variance = -1.0 / inverseDiagonal
+    return errors, variance
+
+##Cross-validation summary of one model: RMSE, mean error and the mean and RMS standardized errors
+##(estimate - observed) / kriging standard error, which should be near 0 and 1 for a well fitted model
+##a near singular system (e.g. a Gaussian model without nugget) can give variances at or below zero, those points
+##are left out of the standardized errors and counted in 'unstable'
+def crossValidationStats(errors, variance):
+    stable = variance > 1e-12 * max(float(np.max(np.abs(variance))), 1e-300)
+    standardized = errors[stable] / np.sqrt(variance[stable])
+    return {'rmse': float(np.sqrt(np.mean(errors ** 2))), 'meanError': float(np.mean(errors)),
+            'meanStandardized': float(np.mean(standardized)) if stable.any() else float('nan'),
+            'rmsStandardized': float(np.sqrt(np.mean(standardized ** 2))) if stable.any() else float('nan'),
+            'unstable': int(np.count_nonzero(~stable))}
+
+##Cross-validates every fitted model, returns {model: stats with the fitted params}
+def crossValidateModels(x, y, z, fits, maxPoints=3000):
+    results = {}
+    for model, (params, error) in fits.items():
+        errors, variance = leaveOneOut(x, y, z, model, params, maxPoints)
+        results[model] = dict(crossValidationStats(errors, variance), params=params)
+    return results
+
+def printCrossValidation(results):
+    print(f"{'model':<12}{'RMSE':>12}{'mean error':>14}{'mean std':>12}{'RMS std':>10}")
+    for model, stats in results.items():
+        print(f"{model:<12}{stats['rmse']:>12.5g}{stats['meanError']:>14.5g}{stats['meanStandardized']:>12.4f}{stats['rmsStandardized']:>10.4f}")
+
+##k nearest observations of every query point from the KD-tree, returns (distances (B, k), rows (B, k))
+def nearestNeighbours(tree, qx, qy, k):
+    distances, rows = tree.query(np.column_stack([qx, qy]), k=k)
+    return distances.reshape(len(qx), k), rows.reshape(len(qx), k)
+
+class OrdinaryKriging:
+    def __init__(self, x, y, z, model="spherical", params=None, neighbours=16, nLags=12, maxLag=None):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.z = np.asarray(z, dtype=np.float64)
+        self.tree = scipy.spatial.cKDTree(np.column_stack([self.x, self.y]))
+        self.neighbours = min(neighbours, len(self.z))
+        self.variogram = empiricalVariogram(self.x, self.y, self.z, nLags, maxLag)
+        self.fits = {}
+        self.crossValidation = {}
+        ##"best" picks the model fitting the variogram most closely, "cv" the one with the lowest leave-one-out RMSE
+        if model == "best":
+            self.fits = fitAllVariograms(*self.variogram)
+            model = min(self.fits, key=lambda name: self.fits[name][1])
+        elif model == "cv":
+            self.fits = fitAllVariograms(*self.variogram)
+            self.crossValidation = crossValidateModels(self.x, self.y, self.z, self.fits)
+            printCrossValidation(self.crossValidation)
+            model = min(self.crossValidation, key=lambda name: self.crossValidation[name]['rmse'])
+        if params is None:
+            params = self.fits[model][0] if model in self.fits else fitVariogram(*self.variogram, model)[0]
+        self.model = model
+        self.params = params
+
+    ##Kriging weights of a batch of query points, returns (neighbour rows (B, k), weights (B, k), semivariances (B, k), mu (B,))
+    def weights(self, qx, qy):
+        k = self.neighbours
+        distances, rows = nearestNeighbours(self.tree, qx, qy, k)
+        px = self.x[rows]
+        py = self.y[rows]
+        dx = px[:, :, None] - px[:, None, :]
+        dy = py[:, :, None] - py[:, None, :]
+        pairDistances = np.sqrt(dx * dx + dy * dy)
+        system = np.ones((len(qx), k + 1, k + 1))
+        system[:, :k, :k] = semivariance(self.model, self.params, pairDistances)
+        system[:, k, k] = 0.0
+        targets = np.ones((len(qx), k + 1))
+        targets[:, :k] = semivariance(self.model, self.params, distances)
+        try:
+            solution = np.linalg.solve(system, targets[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            ##coincident observations make some systems singular, the pseudo-inverse still gives the minimum norm weights
+            solution = np.einsum('bij,bj->bi', np.linalg.pinv(system), targets)
+        return rows, solution[:, :k], targets[:, :k], solution[:, k]
+
+    ##Estimates and kriging variances at the query points, batchSize systems per solve
+    def predict(self, qx, qy, batchSize=10000):
+        qx = np.asarray(qx, dtype=np.float64).ravel()
+        qy = np.asarray(qy, dtype=np.float64).ravel()
+        estimate = np.empty(len(qx))
+        variance = np.empty(len(qx))
+        for start in range(0, len(qx), batchSize):
+            end = min(start + batchSize, len(qx))
+            rows, weights, targets, mu = self.weights(qx[start:end], qy[start:end])
+            estimate[start:end] = np.sum(weights * self.z[rows], axis=1)
+            variance[start:end] = np.sum(weights * targets, axis=1) + mu
+        return estimate, variance
+
+    ##Kriges a grid of cell centres, row 0 is the northern edge as in a raster
+    def predictGrid(self, xMin, yMax, cellSize, nRows, nCols, batchSize=10000):
+        cx = xMin + (np.arange(nCols) + 0.5) * cellSize
+        cy = yMax - (np.arange(nRows) + 0.5) * cellSize
+        gx, gy = np.meshgrid(cx, cy)
+        estimate, variance = self.predict(gx, gy, batchSize)
+        return estimate.reshape(nRows, nCols), variance.reshape(nRows, nCols)
+
+##Inverse distance weighting over the same k nearest neighbour search, a cheap baseline for quick-look maps
+##predict has the OrdinaryKriging signature so either can be handed to rasterTiles.interpolateTiled
+class InverseDistanceWeighting:
+    def __init__(self, x, y, z, neighbours=12, power=2.0):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.z = np.asarray(z, dtype=np.float64)
+        self.tree = scipy.spatial.cKDTree(np.column_stack([self.x, self.y]))
+        self.neighbours = min(neighbours, len(self.z))
+        self.power = power
+        self.model = "idw"
+        self.params = (self.neighbours, power)
+
+    ##Estimates at the query points and the distance to the nearest observation, batchSize points at a time
+    def predict(self, qx, qy, batchSize=100000):
+        qx = np.asarray(qx, dtype=np.float64).ravel()
+        qy = np.asarray(qy, dtype=np.float64).ravel()
+        estimate = np.empty(len(qx))
+        nearest = np.empty(len(qx))
+        for start in range(0, len(qx), batchSize):
+            end = min(start + batchSize, len(qx))
+            distances, rows = nearestNeighbours(self.tree, qx[start:end], qy[start:end], self.neighbours)
+            ##a query on an observation takes its value exactly
+            exact = distances[:, 0] == 0
+            weights = 1.0 / np.where(distances > 0, distances, 1.0) ** self.power
+            weights[exact] = 0.0
+            weights[exact, 0] = 1.0
+            estimate[start:end] = np.sum(weights * self.z[rows], axis=1) / np.sum(weights, axis=1)
+            nearest[start:end] = distances[:, 0]
+        return estimate, nearest
+
+    ##the grid of cell centres is laid out exactly as for kriging
+    predictGrid = OrdinaryKriging.predictGrid
+
+##Grid shape covering the points with cellSize cells, returns (xMin, yMax, nRows, nCols)
+def gridExtent(x, y, cellSize):
+    nCols = max(1, int(np.ceil((x.max() - x.min()) / cellSize)))
+    nRows = max(1, int(np.ceil((y.max() - y.min()) / cellSize)))
+    return float(x.min()), float(y.min()) + nRows * cellSize, nRows, nCols
+
+##Writes a grid as an ESRI ASCII raster, which ArcGIS and GDAL both read, NaN cells become noData
+def writeAsciiGrid(path, grid, xMin, yMin, cellSize, noData=-9999.0):
+    with open(path, 'w') as outFile:
+        outFile.write(f"ncols {grid.shape[1]}\nnrows {grid.shape[0]}\nxllcorner {xMin}\nyllcorner {yMin}\n"
+                      f"cellsize {cellSize}\nNODATA_value {noData}\n")
+        np.savetxt(outFile, np.where(np.isnan(grid), noData, grid), fmt="%.6g")
+    return path
+
+##Reads x, y and value columns from a CSV with tableCheck, dropping rows where any of them is null
+def readPoints(csvPath, valueField, xField, yField, missingTokens=tableCheck.defaultMissingTokens):
+    frame, report = tableCheck.checkCSV(csvPath, missingTokens)
+    points = frame[[xField, yField, valueField]].astype(np.float64).dropna()
+    return points[xField].to_numpy(), points[yField].to_numpy(), points[valueField].to_numpy()
+
+##Times fitting and gridding on synthetic points, for comparison with the arcpy path in hw3.compareKrigingEngines
+def benchmarkKriging(pointCount, gridCells, neighbours=16, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 100000, pointCount)
+    y = rng.uniform(0, 100000, pointCount)
+    z = np.sin(x / 15000.0) + np.cos(y / 20000.0) + rng.normal(0, 0.1, pointCount)
+    start = time.perf_counter()
+    kriging = OrdinaryKriging(x, y, z, "best", neighbours=neighbours)
+    fitSeconds = time.perf_counter() - start
+    side = int(np.sqrt(gridCells))
+    start = time.perf_counter()
+    kriging.predictGrid(0.0, 100000.0, 100000.0 / side, side, side)
+    gridSeconds = time.perf_counter() - start
+    print(f"{pointCount} points, {side * side} cells: {kriging.model} fit in {fitSeconds:.3f} s, grid in {gridSeconds:.3f} s")
+    return {'points': pointCount, 'cells': side * side, 'model': kriging.model, 'fitSeconds': fitSeconds, 'gridSeconds': gridSeconds}
+
+def main():
+    parser = argparse.ArgumentParser(description="Ordinary kriging of CSV point observations to an ESRI ASCII grid.")
+    parser.add_argument('csv', nargs='?')
+    parser.add_argument('valueField', nargs='?')
+    parser.add_argument('xField', nargs='?')
+    parser.add_argument('yField', nargs='?')
+    parser.add_argument('--cell', type=float, default=None, help="cell size, default 1/200 of the wider side")
+    parser.add_argument('--model', default="best", choices=["best", "cv", "idw"] + list(variogramModels))
+    parser.add_argument('--neighbours', type=int, default=16)
+    parser.add_argument('--lonlat', action='store_true', help="x and y are longitude and latitude, project them locally")
+    parser.add_argument('--out', default=None, help="output .asc grid, or .flt for a tiled memory-mapped float grid")
+    parser.add_argument('--clip', default=None, help="GeoJSON clip polygon in the point coordinates, tiles outside it are skipped")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--benchmark', type=int, nargs='*', help="synthetic point counts to time instead of kriging a CSV")
+    args = parser.parse_args()
+    if args.benchmark is not None:
+        for pointCount in args.benchmark or [1000, 10000, 100000]:
+            benchmarkKriging(pointCount, 250000, args.neighbours)
+        return
+    x, y, z = readPoints(args.csv, args.valueField, args.xField, args.yField)
+    if args.lonlat:
+        x, y = localProjection(x, y)
+    cellSize = args.cell or max(x.max() - x.min(), y.max() - y.min()) / 200.0
+    if args.model == "idw":
+        kriging = InverseDistanceWeighting(x, y, z, args.neighbours)
+    else:
+        kriging = OrdinaryKriging(x, y, z, args.model, neighbours=args.neighbours)
+    xMin, yMax, nRows, nCols = gridExtent(x, y, cellSize)
+    outPath = args.out or f"kriging_{args.valueField}.asc"
+    if outPath.endswith(".flt") or args.clip:
+        rings = rasterTiles.ringsFromGeoJSON(args.clip) if args.clip else None
+        outPath = rasterTiles.interpolateTiled(kriging, os.path.splitext(outPath)[0] + ".flt", xMin, yMax, cellSize, nRows, nCols,
+                                               rings, workers=args.workers)
+    else:
+        estimate, variance = kriging.predictGrid(xMin, yMax, cellSize, nRows, nCols)
+        writeAsciiGrid(outPath, estimate, xMin, yMax - nRows * cellSize, cellSize)
+    print(f"{kriging.model} model {kriging.params} interpolated {len(z)} points to {outPath}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import urllib.parse
+import numpy as np
+import afscData
+
+##Load test for afscService
+##Opens a number of concurrent keep-alive clients that each send a mix of /base, /afsc, /nearest and /stats requests,
+##then reports throughput and latency percentiles per endpoint as JSON, in the same spirit as benchmark.py.
+
+##Sends one GET on an open connection and returns (status, body)
+async def fetch(reader, writer, target):
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: afsc\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+##One client connection sending its share of the requests
+async def client(host, port, targets, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for endpoint, target in targets:
+            start = time.perf_counter()
+            status, body = await fetch(reader, writer, target)
+            latencies.setdefault(endpoint, []).append((time.perf_counter() - start, status))
+    finally:
+        writer.close()
+
+async def run(host, port, clients, requestsPerClient, bases, afscs, seed):
+    rng = random.Random(seed)
+    plans = []
+    for i in range(clients):
+        targets = []
+        for j in range(requestsPerClient):
+            kind = rng.choices(["base", "afsc", "nearest", "stats"], weights=[4, 4, 3, 1])[0]
+            if kind == "base":
+                targets.append((kind, "/base/" + urllib.parse.quote(rng.choice(bases))))
+            elif kind == "afsc":
+                targets.append((kind, "/afsc/" + urllib.parse.quote(rng.choice(afscs))))
+            elif kind == "nearest":
+                targets.append((kind, f"/nearest?lat={rng.uniform(-60, 70):.2f}&lon={rng.uniform(-180, 180):.2f}&k=5"))
+            else:
+                targets.append((kind, "/stats"))
+        plans.append(targets)
+    latencies = {}
+    start = time.perf_counter()
+    await asyncio.gather(*[client(host, port, targets, latencies) for targets in plans])
+    seconds = time.perf_counter() - start
+    report = {'clients': clients, 'requests': clients * requestsPerClient, 'seconds': round(seconds, 4),
+              'requestsPerSecond': round(clients * requestsPerClient / seconds, 1), 'endpoints': {}}
+    for endpoint, samples in sorted(latencies.items()):
+        times = np.array([sample[0] for sample in samples]) * 1000.0
+        report['endpoints'][endpoint] = {'count': len(samples), 'errors': sum(1 for sample in samples if sample[1] != 200),
+                                         'p50ms': round(float(np.percentile(times, 50)), 3),
+                                         'p95ms': round(float(np.percentile(times, 95)), 3),
+                                         'p99ms': round(float(np.percentile(times, 99)), 3)}
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the AFSC HTTP service.")
+    parser.add_argument('--csv', required=True, help="merged CSV the service was started with, used for the request mix")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200, help="requests per client")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='loadtest_results.json')
+    args = parser.parse_args()
+
+    baseDict = afscData.buildBaseDict(afscData.loadBaseColumns(args.csv))
+    afscs = sorted(afscData.buildAFSCDict(baseDict))
+    report = asyncio.run(run(args.host, args.port, args.clients, args.requests, sorted(baseDict), afscs, args.seed))
+    with open(args.out, 'w') as outFile:
+        json.dump(report, outFile, indent=1)
+    print(json.dumps(report, indent=1))
+    print(f"Load test results written to {args.out}")
+
+if __name__ == '__main__':
+    main()
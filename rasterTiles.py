@@ -0,0 +1,192 @@
+import concurrent.futures
+import json
+import os
+import numpy as np
+
+##Tiled, memory-mapped raster interpolation
+##The output is an ESRI float grid (.flt raw little endian float32 + .hdr), which ArcGIS and GDAL read directly,
+##opened as a np.memmap so the full raster never has to fit in memory. The grid is cut into square tiles, tiles
+##entirely outside the clip polygon are skipped and left as NoData, and the rest are interpolated by a process pool
+##where every worker writes its tiles straight into the shared file. Within a tile a scanline mask of the clip
+##polygon picks the cells to interpolate, so the written grid needs no separate clip step.
+
+##Writes the .hdr of an ESRI float grid and creates the .flt as a memory map filled with noData
+def createFloatGrid(path, nRows, nCols, xMin, yMin, cellSize, noData=-9999.0):
+    stem = os.path.splitext(path)[0]
+    with open(stem + ".hdr", 'w') as outFile:
+        outFile.write(f"ncols {nCols}\nnrows {nRows}\nxllcorner {xMin}\nyllcorner {yMin}\ncellsize {cellSize}\n"
+                      f"NODATA_value {noData}\nbyteorder LSBFIRST\n")
+    grid = np.memmap(stem + ".flt", dtype='<f4', mode='w+', shape=(nRows, nCols))
+    for start in range(0, nRows, 1024):
+        grid[start:start + 1024] = noData
+    grid.flush()
+    return grid
+
+##Opens an existing float grid for reading or writing
+def openFloatGrid(path, mode='r+'):
+    stem = os.path.splitext(path)[0]
+    header = {}
+    with open(stem + ".hdr") as inFile:
+        for line in inFile:
+            key, value = line.split()
+            header[key.lower()] = value
+    grid = np.memmap(stem + ".flt", dtype='<f4', mode=mode, shape=(int(header['nrows']), int(header['ncols'])))
+    return grid, header
+
+##Row/column windows (r0, r1, c0, c1) of the tiles covering the grid
+def tileWindows(nRows, nCols, tileSize):
+    return [(r0, min(r0 + tileSize, nRows), c0, min(c0 + tileSize, nCols))
+            for r0 in range(0, nRows, tileSize) for c0 in range(0, nCols, tileSize)]
+
+##Polygon rings from a GeoJSON file of Polygon or MultiPolygon features, each ring an (N, 2) array of x, y
+def ringsFromGeoJSON(path):
+    with open(path) as inFile:
+        data = json.load(inFile)
+    features = data['features'] if data.get('type') == 'FeatureCollection' else [data]
+    rings = []
+    for feature in features:
+        geometry = feature.get('geometry', feature)
+        polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+        for polygon in polygons:
+            rings.extend(np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon)
+    return rings
+
+##Even-odd point in polygon test for an array of points against all rings, in chunks of points x edges
+def pointsInRings(x, y, rings, chunkCells=4000000):
+    x = np.asarray(x, dtype=np.float64).ravel()
+    y = np.asarray(y, dtype=np.float64).ravel()
+    inside = np.zeros(len(x), dtype=bool)
+    for ring in rings:
+        ax, ay = ring[:, 0], ring[:, 1]
+        bx, by = np.roll(ax, -1), np.roll(ay, -1)
+        slope = np.where(ay != by, (bx - ax) / np.where(ay != by, by - ay, 1.0), 0.0)
+        step = max(1, chunkCells // len(ax))
+        for start in range(0, len(x), step):
+            px = x[start:start + step, None]
+            py = y[start:start + step, None]
+            crosses = ((ay > py) != (by > py)) & (px < ax + (py - ay) * slope)
+            inside[start:start + step] ^= (np.count_nonzero(crosses, axis=1) % 2).astype(bool)
+    return inside
+
+##True when any ring edge passes through the rectangle, by clipping every edge to it at once (Liang-Barsky)
+def edgesCrossRectangle(rings, xMin, yMin, xMax, yMax):
+    for ring in rings:
+        ax, ay = ring[:, 0], ring[:, 1]
+        dx, dy = np.roll(ax, -1) - ax, np.roll(ay, -1) - ay
+        low = np.zeros(len(ax))
+        high = np.ones(len(ax))
+        possible = np.ones(len(ax), dtype=bool)
+        for p, q in ((-dx, ax - xMin), (dx, xMax - ax), (-dy, ay - yMin), (dy, yMax - ay)):
+            parallel = p == 0
+            possible &= ~(parallel & (q < 0))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = np.where(parallel, 0.0, q / np.where(parallel, 1.0, p))
+            low = np.where(~parallel & (p < 0), np.maximum(low, t), low)
+            high = np.where(~parallel & (p > 0), np.minimum(high, t), high)
+        if np.any(possible & (low <= high)):
+            return True
+    return False
+
+##True when the tile window overlaps the polygon: an edge crosses it, or it lies wholly inside
+def tileTouchesPolygon(window, rings, xMin, yMax, cellSize):
+    r0, r1, c0, c1 = window
+    left, right = xMin + c0 * cellSize, xMin + c1 * cellSize
+    top, bottom = yMax - r0 * cellSize, yMax - r1 * cellSize
+    if edgesCrossRectangle(rings, left, bottom, right, top):
+        return True
+    return bool(pointsInRings(np.array([(left + right) / 2.0]), np.array([(top + bottom) / 2.0]), rings)[0])
+
+##Clip mask of a grid window by scanline fill, True where the cell centre is inside the rings (even-odd)
+##Every ring edge is intersected with the centre line of every row at once, each crossing toggles the parity from
+##the first cell centre to its right on, and a cumulative sum along the row turns the toggles into spans
+def scanlineMask(rings, xMin, yMax, cellSize, window):
+    r0, r1, c0, c1 = window
+    nCols = c1 - c0
+    toggles = np.zeros((r1 - r0, nCols + 1), dtype=np.int32)
+    rowY = yMax - (np.arange(r0, r1) + 0.5) * cellSize
+    for ring in rings:
+        ax, ay = ring[:, 0], ring[:, 1]
+        bx, by = np.roll(ax, -1), np.roll(ay, -1)
+        crossing = (ay[:, None] > rowY) != (by[:, None] > rowY)
+        edge, row = np.nonzero(crossing)
+        crossX = ax[edge] + (rowY[row] - ay[edge]) * (bx[edge] - ax[edge]) / (by[edge] - ay[edge])
+        column = np.clip(np.ceil((crossX - xMin) / cellSize - 0.5) - c0, 0, nCols).astype(np.intp)
+        np.add.at(toggles, (row, column), 1)
+    return (np.cumsum(toggles[:, :nCols], axis=1) % 2).astype(bool)
+
+##Sets every cell of an existing float grid outside the rings to NoData, in place, one tile of the memory map at a time
+##for grids made without a clip polygon, e.g. krigingEngine --out grid.flt; run this file to clip one from the shell
+def clipInPlace(gridPath, rings, tileSize=256):
+    grid, header = openFloatGrid(gridPath)
+    nRows, nCols = grid.shape
+    cellSize = float(header['cellsize'])
+    xMin = float(header['xllcorner'])
+    yMax = float(header['yllcorner']) + nRows * cellSize
+    noData = float(header['nodata_value'])
+    cleared = 0
+    for window in tileWindows(nRows, nCols, tileSize):
+        r0, r1, c0, c1 = window
+        outside = ~scanlineMask(rings, xMin, yMax, cellSize, window)
+        grid[r0:r1, c0:c1][outside] = noData
+        cleared += int(outside.sum())
+    grid.flush()
+    return cleared
+
+##State of a worker process, set once by the pool initializer so the interpolator is pickled once per worker
+workerState = {}
+
+def initTileWorker(interpolator, gridPath, xMin, yMax, cellSize, noData, rings=None):
+    workerState.update(interpolator=interpolator, gridPath=gridPath, xMin=xMin, yMax=yMax, cellSize=cellSize, noData=noData,
+                       rings=rings)
+    workerState['grid'] = openFloatGrid(gridPath)[0]
+
+##Interpolates one tile into the shared grid and returns the number of cells written
+##With clip rings only the cells inside the scanline mask are interpolated and written, the rest keep their NoData,
+##so interpolation and clipping are one pass over the grid
+def interpolateTile(window):
+    r0, r1, c0, c1 = window
+    cellSize = workerState['cellSize']
+    rings = workerState['rings']
+    cx = workerState['xMin'] + (np.arange(c0, c1) + 0.5) * cellSize
+    cy = workerState['yMax'] - (np.arange(r0, r1) + 0.5) * cellSize
+    gx, gy = np.meshgrid(cx, cy)
+    tile = workerState['grid'][r0:r1, c0:c1]
+    if rings:
+        inside = scanlineMask(rings, workerState['xMin'], workerState['yMax'], cellSize, window)
+        if not inside.any():
+            return 0
+        estimate = workerState['interpolator'].predict(gx[inside], gy[inside])[0]
+        tile[inside] = np.where(np.isnan(estimate), workerState['noData'], estimate)
+        return int(inside.sum())
+    estimate = workerState['interpolator'].predict(gx, gy)[0].reshape(r1 - r0, c1 - c0)
+    tile[:] = np.where(np.isnan(estimate), workerState['noData'], estimate)
+    return (r1 - r0) * (c1 - c0)
+
+##Interpolates the grid tile by tile into the float grid at gridPath
+##interpolator is anything with predict(x, y) -> (estimate, ...) such as krigingEngine.OrdinaryKriging
+##rings are clip polygon rings in grid coordinates, tiles wholly outside them are skipped and cells outside them stay
+##NoData, so the result is already clipped
+def interpolateTiled(interpolator, gridPath, xMin, yMax, cellSize, nRows, nCols, rings=None, tileSize=256,
+                     workers=None, noData=-9999.0):
+    createFloatGrid(gridPath, nRows, nCols, xMin, yMax - nRows * cellSize, cellSize, noData)
+    windows = tileWindows(nRows, nCols, tileSize)
+    if rings:
+        windows = [window for window in windows if tileTouchesPolygon(window, rings, xMin, yMax, cellSize)]
+    skipped = len(tileWindows(nRows, nCols, tileSize)) - len(windows)
+    workers = workers or os.cpu_count() or 1
+    initArgs = (interpolator, gridPath, xMin, yMax, cellSize, noData, rings)
+    if workers == 1 or len(windows) < 2:
+        initTileWorker(*initArgs)
+        cells = sum(interpolateTile(window) for window in windows)
+        workerState['grid'].flush()
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initTileWorker, initargs=initArgs) as pool:
+            cells = sum(pool.map(interpolateTile, windows, chunksize=max(1, len(windows) // (workers * 8))))
+    print(f"Interpolated {len(windows)} tiles ({cells} cells) into {gridPath}, skipped {skipped} tiles outside the clip polygon")
+    return gridPath
+
+##Clips an existing float grid to a GeoJSON polygon in place: python rasterTiles.py grid.flt clip.geojson
+if __name__ == '__main__':
+    import sys
+    cleared = clipInPlace(sys.argv[1], ringsFromGeoJSON(sys.argv[2]))
+    print(f"Set {cleared} cells outside {sys.argv[2]} to NoData in {sys.argv[1]}")
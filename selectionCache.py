@@ -0,0 +1,53 @@
+import collections
+
+##Bounded LRU cache of interactive base and AFSC selections
+##Entries are keyed on the mapping type, the selection and the data version (the dataMan run key), so a changed CSV
+##never returns stale layers. Each entry holds the selected point rows and the path of the layer built for them.
+
+class SelectionEntry:
+    __slots__ = ('rows', 'outputPath')
+
+    def __init__(self, rows, outputPath):
+        self.rows = rows
+        self.outputPath = outputPath
+
+class SelectionCache:
+    def __init__(self, maxEntries=32):
+        self.maxEntries = maxEntries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    ##Returns the cached entry and marks it most recently used, or None on a miss
+    ##isValid can reject an entry whose output no longer exists, which is then dropped and counted as a miss
+    def get(self, mappingVar, selection, dataVersion, isValid=None):
+        key = (mappingVar, selection, dataVersion)
+        entry = self.entries.get(key)
+        if entry is not None and isValid is not None and not isValid(entry):
+            del self.entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    ##Stores a built selection, evicting the least recently used entries beyond maxEntries
+    def put(self, mappingVar, selection, dataVersion, rows, outputPath):
+        key = (mappingVar, selection, dataVersion)
+        entry = SelectionEntry(rows, outputPath)
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {'entries': len(self.entries), 'maxEntries': self.maxEntries, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+
+##Stage manifest for idempotent dataMan runs
+##The manifest is a JSON file next to the geodatabase keyed on a hash of the input CSV and the run parameters.
+##Each finished stage is recorded with its outputs, so a rerun on unchanged inputs skips straight to the results.
+
+##Hashes a file in fixed size blocks so large rosters are never read into memory at once
+def hashFile(path, blockSize=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as inFile:
+        block = inFile.read(blockSize)
+        while block:
+            digest.update(block)
+            block = inFile.read(blockSize)
+    return digest.hexdigest()
+
+##Builds the run key from the CSV contents and the parameters that change the outputs
+def runKey(csvPath, params):
+    digest = hashlib.sha256()
+    digest.update(hashFile(csvPath).encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+##Path of the manifest file kept beside the geodatabase
+def manifestPath(folder, geodatabaseName):
+    return os.path.join(folder, f"{geodatabaseName}_manifest.json")
+
+##Loads the manifest for a run key, starting a fresh one if the inputs changed or none exists
+def loadManifest(path, key):
+    if os.path.exists(path):
+        try:
+            with open(path) as inFile:
+                manifest = json.load(inFile)
+            if manifest.get('key') == key:
+                return manifest
+            print("Input CSV or parameters changed since the last run. Rebuilding all stages.")
+        except (ValueError, OSError):
+            print(f"Manifest '{path}' could not be read. Rebuilding all stages.")
+    return {'key': key, 'path': path, 'stages': [], 'outputs': {}}
+
+##Checks whether a stage already finished for this run key
+def stageDone(manifest, stage):
+    return stage in manifest['stages']
+
+##Checks whether every stage in the list already finished
+def allStagesDone(manifest, stages):
+    return all(stage in manifest['stages'] for stage in stages)
+
+##Records a finished stage and its outputs, writing the manifest atomically
+def recordStage(manifest, stage, **outputs):
+    if stage not in manifest['stages']:
+        manifest['stages'].append(stage)
+    manifest['outputs'].update(outputs)
+    tempPath = manifest['path'] + '.tmp'
+    with open(tempPath, 'w') as outFile:
+        json.dump(manifest, outFile)
+    os.replace(tempPath, manifest['path'])
@@ -0,0 +1,152 @@
+import contextlib
+import functools
+import json
+import time
+
+##Stage level timing and I/O counters for dataMan and the mapping functions
+##Start a recorder with startRecording, run the pipeline, then read recorder.report() or write it with writeReport,
+##or wrap the run in `with recording(path)`; finalCode.dataMan and MappingSession do this when given a statsPath.
+##Each stage records wall time, rows read, rows written, cursors opened, tables created and tables deleted.
+##An optional callback receives every finished stage record, e.g. to forward it to a log or a dashboard.
+##When no recorder is active every call here returns immediately, so the instrumentation costs nothing in normal runs.
+
+counterNames = ["rowsRead", "rowsWritten", "cursorsOpened", "tablesCreated", "tablesDeleted"]
+
+class StageRecorder:
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.stages = []
+        self.openStages = []
+        self.openStarts = []
+
+    ##Times a stage; stages can nest and counters go to the innermost open stage
+    @contextlib.contextmanager
+    def stage(self, name):
+        record = {'stage': name, 'parent': self.openStages[-1]['stage'] if self.openStages else None}
+        for counter in counterNames:
+            record[counter] = 0
+        self.openStages.append(record)
+        self.openStarts.append(time.perf_counter())
+        try:
+            yield record
+        finally:
+            ##closeOpenStages may already have ended the stage
+            if self.openStages and self.openStages[-1] is record:
+                self.endStage()
+
+    ##Ends the innermost open stage and hands its record to the callback
+    def endStage(self):
+        record = self.openStages.pop()
+        record['wallTime'] = time.perf_counter() - self.openStarts.pop()
+        self.stages.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    ##Ends every stage that is still open, innermost first, so a report never misses a running stage
+    def closeOpenStages(self):
+        while self.openStages:
+            self.endStage()
+
+    def add(self, **counts):
+        if self.openStages:
+            record = self.openStages[-1]
+            for counter, value in counts.items():
+                record[counter] += value
+
+    ##Structured report: every stage record plus totals over the top level stages
+    def report(self):
+        totals = {counter: 0 for counter in counterNames}
+        totals['wallTime'] = 0.0
+        for record in self.stages:
+            for counter in counterNames:
+                totals[counter] += record[counter]
+            if record['parent'] is None:
+                totals['wallTime'] += record['wallTime']
+        return {'stages': self.stages, 'totals': totals}
+
+    def writeReport(self, path):
+        with open(path, 'w') as outFile:
+            json.dump(self.report(), outFile, indent=1)
+        return path
+
+activeRecorder = None
+
+##Starts recording stages into a new recorder and returns it
+def startRecording(callback=None):
+    global activeRecorder
+    activeRecorder = StageRecorder(callback)
+    return activeRecorder
+
+##Stops recording and returns the recorder that was active
+def stopRecording():
+    global activeRecorder
+    recorder = activeRecorder
+    activeRecorder = None
+    return recorder
+
+##Records every stage run inside the block and writes the report to path when the block ends
+##does nothing when path is None or a recorder is already active, so an outer recording keeps the stages
+@contextlib.contextmanager
+def recording(path, callback=None):
+    if path is None or activeRecorder is not None:
+        yield activeRecorder
+        return
+    recorder = startRecording(callback)
+    try:
+        yield recorder
+    finally:
+        stopRecording()
+        recorder.writeReport(path)
+        print(f"Stage statistics written to {path}")
+
+##Times a stage on the active recorder, or does nothing when none is active
+def stage(name):
+    if activeRecorder is None:
+        return contextlib.nullcontext()
+    return activeRecorder.stage(name)
+
+##Decorator that runs every call of a function as a stage of the active recorder
+def timedStage(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+##Adds counts to the current stage of the active recorder
+def record(**counts):
+    if activeRecorder is not None:
+        activeRecorder.add(**counts)
+
+##Wraps an arcpy cursor so the rows it reads and writes are counted; used as `with counted(arcpy.da.SearchCursor(...))`
+def counted(cursor):
+    if activeRecorder is None:
+        return cursor
+    record(cursorsOpened=1)
+    return CountingCursor(cursor)
+
+class CountingCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __enter__(self):
+        self.cursor.__enter__()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return self.cursor.__exit__(excType, excValue, traceback)
+
+    def __iter__(self):
+        for row in self.cursor:
+            record(rowsRead=1)
+            yield row
+
+    def insertRow(self, row):
+        record(rowsWritten=1)
+        return self.cursor.insertRow(row)
+
+    def updateRow(self, row):
+        record(rowsWritten=1)
+        return self.cursor.updateRow(row)
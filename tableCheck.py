@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+##Column type inference and coercion for point observation CSVs, done once while the CSV is read
+##Every column is read as text, missing-value tokens (e.g. 'M' for missing in station tables) become null and
+##the rest is parsed to numbers with one vectorized pd.to_numeric per column. A column is numeric when at least
+##numericShare of its non-missing cells parse; its unparseable cells become null. The result is a structured
+##array ready for arcpy.da.NumPyArrayToTable and a per-column report of coerced and null counts.
+
+defaultMissingTokens = ("M", "")
+
+##Infers and coerces every column, returns (pandas DataFrame of the coerced columns, report)
+##report maps column -> {type, rows, missing, coerced, invalid, nulls}: missing token cells, text cells turned into
+##numbers, cells of a numeric column that were not numbers and became null, and the total nulls after coercion
+def checkColumns(table, missingTokens=defaultMissingTokens, numericShare=0.9):
+    missingTokens = set(token.strip() for token in missingTokens)
+    columns = {}
+    report = {}
+    for name in table.columns:
+        text = table[name].astype(str).str.strip()
+        missing = text.isin(missingTokens)
+        numbers = pd.to_numeric(text.where(~missing), errors='coerce')
+        present = int((~missing).sum())
+        parsed = int(numbers.notna().sum())
+        if present and parsed >= numericShare * present:
+            ##to_numeric finds the numeric cells, astype converts them with correctly rounded float parsing
+            valid = numbers.notna()
+            exact = pd.Series(np.nan, index=text.index)
+            exact[valid] = text[valid].astype(np.float64)
+            columns[name] = exact
+            report[name] = {'type': "DOUBLE", 'rows': len(text), 'missing': int(missing.sum()), 'coerced': parsed,
+                            'invalid': present - parsed, 'nulls': len(text) - parsed}
+        else:
+            columns[name] = text.where(~missing)
+            report[name] = {'type': "TEXT", 'rows': len(text), 'missing': int(missing.sum()), 'coerced': 0,
+                            'invalid': 0, 'nulls': int(missing.sum())}
+    return pd.DataFrame(columns), report
+
+##Reads a CSV in one pass and checks it, returns (DataFrame, report)
+def checkCSV(csvPath, missingTokens=defaultMissingTokens, numericShare=0.9):
+    table = pd.read_csv(csvPath, dtype=str, keep_default_na=False, na_filter=False, encoding='utf-8-sig')
+    return checkColumns(table, missingTokens, numericShare)
+
+##Structured array for arcpy.da.NumPyArrayToTable, numeric nulls stay NaN and text nulls become empty strings
+def toStructuredArray(frame):
+    fields = []
+    for name in frame.columns:
+        column = frame[name]
+        if column.dtype == np.float64:
+            fields.append((name, 'f8'))
+        else:
+            fields.append((name, f"U{max(1, int(column.fillna('').str.len().max() or 1))}"))
+    array = np.empty(len(frame), dtype=fields)
+    for name, fieldType in fields:
+        array[name] = frame[name].to_numpy() if fieldType == 'f8' else frame[name].fillna('').to_numpy(dtype=str)
+    return array
+
+##Prints the per-column report
+def printReport(report):
+    print(f"{'column':<24}{'type':<8}{'rows':>8}{'missing':>9}{'coerced':>9}{'invalid':>9}{'nulls':>8}")
+    for name, counts in report.items():
+        print(f"{name:<24}{counts['type']:<8}{counts['rows']:>8}{counts['missing']:>9}{counts['coerced']:>9}"
+              f"{counts['invalid']:>9}{counts['nulls']:>8}")
+
+if __name__ == '__main__':
+    import sys
+    frame, report = checkCSV(sys.argv[1], tuple(sys.argv[2:]) or defaultMissingTokens)
+    printReport(report)
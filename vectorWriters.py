@@ -0,0 +1,299 @@
+import itertools
+import json
+import os
+import sqlite3
+import struct
+
+##Streaming point writers for createPointShapeFile style output without arcpy
+##Every writer takes the same field list as createPointFeatureClass, [(name, "TEXT" | "DOUBLE" | "LONG")], and rows
+##laid out like an arcpy InsertCursor row with SHAPE@XY last: (value, value, ..., (lon, lat)).
+##Rows are pulled from any iterable in batches of batchSize and each batch is written in one transaction or write call.
+
+##Field schemas of the point layers made by finalCode.createPointShapeFile for each mapping type
+mappingFields = {
+    "AFSCCount": [("Base", "TEXT"), ("Latitude", "DOUBLE"), ("Longitude", "DOUBLE"), ("AFSCCount", "DOUBLE")],
+    "Base": [("Base", "TEXT"), ("Latitude", "DOUBLE"), ("Longitude", "DOUBLE"), ("AFSC", "TEXT")],
+    "AFSC": [("Base", "TEXT"), ("Latitude", "DOUBLE"), ("Longitude", "DOUBLE")],
+}
+
+##Splits an iterable of rows into lists of at most batchSize rows
+def batches(rows, batchSize):
+    rows = iter(rows)
+    batch = list(itertools.islice(rows, batchSize))
+    while batch:
+        yield batch
+        batch = list(itertools.islice(rows, batchSize))
+
+##Base class with the batching loop and context manager shared by every writer
+class PointWriter:
+    def __init__(self, path, layerName, fields, batchSize=10000):
+        self.path = path
+        self.layerName = layerName
+        self.fields = list(fields)
+        self.batchSize = batchSize
+        self.rowsWritten = 0
+        self.bounds = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    ##Writes every row of an iterable and returns how many rows were written by this call
+    def writeRows(self, rows):
+        written = 0
+        for batch in batches(rows, self.batchSize):
+            for row in batch:
+                x, y = row[-1]
+                self.bounds = [min(self.bounds[0], x), min(self.bounds[1], y), max(self.bounds[2], x), max(self.bounds[3], y)]
+            self.writeBatch(batch)
+            written += len(batch)
+        self.rowsWritten += written
+        return written
+
+    def writeBatch(self, batch):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+##GeoPackage writer, a sqlite database with the gpkg metadata tables and point geometries as GeoPackage blobs
+class GeoPackageWriter(PointWriter):
+    sqliteTypes = {"TEXT": "TEXT", "DOUBLE": "DOUBLE", "LONG": "INTEGER"}
+
+    def __init__(self, path, layerName, fields, batchSize=10000):
+        super().__init__(path, layerName, fields, batchSize)
+        self.connection = sqlite3.connect(path)
+        self.createMetadata()
+        self.connection.execute(f'DROP TABLE IF EXISTS "{layerName}"')
+        self.connection.execute("DELETE FROM gpkg_contents WHERE table_name = ?", (layerName,))
+        self.connection.execute("DELETE FROM gpkg_geometry_columns WHERE table_name = ?", (layerName,))
+        columns = ', '.join(f'"{name}" {self.sqliteTypes[fieldType]}' for name, fieldType in self.fields)
+        self.connection.execute(f'CREATE TABLE "{layerName}" (fid INTEGER PRIMARY KEY AUTOINCREMENT, geom POINT, {columns})')
+        self.connection.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) VALUES (?, 'features', ?, 4326)",
+                                (layerName, layerName))
+        self.connection.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', 'POINT', 4326, 0, 0)", (layerName,))
+        self.connection.commit()
+        placeholders = ', '.join('?' for field in range(len(self.fields) + 1))
+        names = ', '.join(f'"{name}"' for name, fieldType in self.fields)
+        self.insertSQL = f'INSERT INTO "{layerName}" (geom, {names}) VALUES ({placeholders})'
+
+    ##Creates the required GeoPackage tables and spatial reference rows if the file is new
+    def createMetadata(self):
+        self.connection.execute("PRAGMA application_id = 1196444487")
+        self.connection.execute("PRAGMA user_version = 10300")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY,
+            organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT)""")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL,
+            identifier TEXT UNIQUE, description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+            min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER REFERENCES gpkg_spatial_ref_sys(srs_id))""")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS gpkg_geometry_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL,
+            geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL,
+            CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name))""")
+        self.connection.executemany("INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)", [
+            ("Undefined cartesian SRS", -1, "NONE", -1, "undefined", None),
+            ("Undefined geographic SRS", 0, "NONE", 0, "undefined", None),
+            ("WGS 84 geodetic", 4326, "EPSG", 4326,
+             'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],PRIMEM["Greenwich",0],'
+             'UNIT["degree",0.0174532925199433],AUTHORITY["EPSG","4326"]]', None),
+        ])
+
+    ##GeoPackage binary header (no envelope, little endian) followed by a WKB point
+    @staticmethod
+    def pointBlob(x, y):
+        return b'GP\x00\x01' + struct.pack('<i', 4326) + struct.pack('<BIdd', 1, 1, x, y)
+
+    def writeBatch(self, batch):
+        with self.connection:
+            self.connection.executemany(self.insertSQL, [(self.pointBlob(*row[-1]),) + tuple(row[:-1]) for row in batch])
+
+    def close(self):
+        if self.connection is None:
+            return
+        if self.rowsWritten:
+            with self.connection:
+                self.connection.execute("""UPDATE gpkg_contents SET min_x = ?, min_y = ?, max_x = ?, max_y = ?,
+                    last_change = strftime('%Y-%m-%dT%H:%M:%fZ','now') WHERE table_name = ?""", self.bounds + [self.layerName])
+        self.connection.close()
+        self.connection = None
+
+##Newline-delimited GeoJSON writer, one Feature per line
+class GeoJSONSeqWriter(PointWriter):
+    def __init__(self, path, layerName, fields, batchSize=10000):
+        super().__init__(path, layerName, fields, batchSize)
+        self.names = [name for name, fieldType in self.fields]
+        self.outFile = open(path, 'w', encoding='utf-8')
+
+    def writeBatch(self, batch):
+        lines = []
+        for row in batch:
+            x, y = row[-1]
+            feature = {"type": "Feature", "geometry": {"type": "Point", "coordinates": [x, y]},
+                       "properties": dict(zip(self.names, row[:-1]))}
+            lines.append(json.dumps(feature, separators=(',', ':')))
+        self.outFile.write('\n'.join(lines) + '\n')
+
+    def close(self):
+        if not self.outFile.closed:
+            self.outFile.close()
+
+##Minimal FlatBuffers encoder used by the FlatGeobuf writer
+##A table is a list indexed by field id of None or (kind, value). Objects are laid out front to back,
+##vtable then table then children, so every uoffset points forward as the format requires.
+class FlatBufferBuilder:
+    scalarFormats = {'ubyte': 'B', 'bool': '?', 'ushort': 'H', 'int': 'i', 'uint': 'I', 'ulong': 'Q', 'double': 'd'}
+
+    def __init__(self):
+        self.buffer = bytearray(4)
+
+    def pad(self, alignment, extra=0):
+        self.buffer.extend(bytes(-(len(self.buffer) + extra) % alignment))
+
+    def finish(self, table):
+        struct.pack_into('<I', self.buffer, 0, self.writeTable(table))
+        return bytes(self.buffer)
+
+    def writeTable(self, table):
+        present = [(fieldId, kind, value) for fieldId, entry in enumerate(table) if entry is not None for kind, value in [entry]]
+        sizeOf = lambda kind: struct.calcsize(self.scalarFormats[kind]) if kind in self.scalarFormats else 4
+        ##place the largest inline fields first so padding stays minimal
+        offsets = {}
+        position = 4
+        for fieldId, kind, value in sorted(present, key=lambda field: -sizeOf(field[1])):
+            size = sizeOf(kind)
+            position += -position % size
+            offsets[fieldId] = position
+            position += size
+        fieldCount = max([fieldId + 1 for fieldId, kind, value in present] + [0])
+
+        self.pad(2)
+        vtablePosition = len(self.buffer)
+        self.buffer.extend(struct.pack(f'<{2 + fieldCount}H', 4 + 2 * fieldCount, position,
+                                       *[offsets.get(fieldId, 0) for fieldId in range(fieldCount)]))
+        self.pad(8)
+        tablePosition = len(self.buffer)
+        self.buffer.extend(bytes(position))
+        struct.pack_into('<i', self.buffer, tablePosition, tablePosition - vtablePosition)
+        children = []
+        for fieldId, kind, value in present:
+            if kind in self.scalarFormats:
+                struct.pack_into('<' + self.scalarFormats[kind], self.buffer, tablePosition + offsets[fieldId], value)
+            else:
+                children.append((tablePosition + offsets[fieldId], kind, value))
+        for slot, kind, value in children:
+            struct.pack_into('<I', self.buffer, slot, self.writeChild(kind, value) - slot)
+        return tablePosition
+
+    def writeChild(self, kind, value):
+        if kind == 'table':
+            return self.writeTable(value)
+        if kind == 'string':
+            data = value.encode('utf-8')
+            self.pad(4)
+            position = len(self.buffer)
+            self.buffer.extend(struct.pack('<I', len(data)) + data + b'\x00')
+            return position
+        if kind == 'doubles':
+            self.pad(8, extra=4)
+            position = len(self.buffer)
+            self.buffer.extend(struct.pack(f'<I{len(value)}d', len(value), *value))
+            return position
+        if kind == 'ubytes':
+            self.pad(4)
+            position = len(self.buffer)
+            self.buffer.extend(struct.pack('<I', len(value)) + bytes(value))
+            return position
+        if kind == 'tables':
+            self.pad(4)
+            position = len(self.buffer)
+            self.buffer.extend(struct.pack('<I', len(value)) + bytes(4 * len(value)))
+            for i, table in enumerate(value):
+                slot = position + 4 + 4 * i
+                struct.pack_into('<I', self.buffer, slot, self.writeTable(table) - slot)
+            return position
+        raise ValueError(f"Unknown FlatBuffers field kind '{kind}'")
+
+##FlatGeobuf writer without a spatial index, so features can be streamed without knowing the count up front
+class FlatGeobufWriter(PointWriter):
+    magic = b'fgb\x03fgb\x00'
+    columnTypes = {"LONG": 7, "DOUBLE": 10, "TEXT": 11}
+
+    def __init__(self, path, layerName, fields, batchSize=10000):
+        super().__init__(path, layerName, fields, batchSize)
+        columns = [[('string', name), ('ubyte', self.columnTypes[fieldType])] for name, fieldType in self.fields]
+        ##header fields: name, envelope, geometry_type, has_z, has_m, has_t, has_tm, columns, features_count,
+        ##index_node_size, crs; index_node_size must be written as 0 because its default is 16
+        header = [('string', layerName), None, ('ubyte', 1), None, None, None, None, ('tables', columns),
+                  None, ('ushort', 0), ('table', [('string', 'EPSG'), ('int', 4326)])]
+        headerBytes = FlatBufferBuilder().finish(header)
+        self.outFile = open(path, 'wb')
+        self.outFile.write(self.magic + struct.pack('<I', len(headerBytes)) + headerBytes)
+
+    ##Encodes the non-null properties as column index followed by the little endian value
+    def properties(self, row):
+        data = bytearray()
+        for column, ((name, fieldType), value) in enumerate(zip(self.fields, row)):
+            if value is None:
+                continue
+            data.extend(struct.pack('<H', column))
+            if fieldType == "TEXT":
+                text = str(value).encode('utf-8')
+                data.extend(struct.pack('<I', len(text)) + text)
+            elif fieldType == "LONG":
+                data.extend(struct.pack('<q', int(value)))
+            else:
+                data.extend(struct.pack('<d', float(value)))
+        return data
+
+    def writeBatch(self, batch):
+        chunk = bytearray()
+        for row in batch:
+            x, y = row[-1]
+            feature = [('table', [None, ('doubles', [x, y])]), ('ubytes', self.properties(row[:-1]))]
+            featureBytes = FlatBufferBuilder().finish(feature)
+            chunk.extend(struct.pack('<I', len(featureBytes)) + featureBytes)
+        self.outFile.write(chunk)
+
+    def close(self):
+        if not self.outFile.closed:
+            self.outFile.close()
+
+##Point feature class writer through arcpy, for geodatabase output on machines that have ArcGIS
+class ArcpyPointWriter(PointWriter):
+    def __init__(self, path, layerName, fields, batchSize=10000):
+        super().__init__(path, layerName, fields, batchSize)
+        import arcpy
+        self.arcpy = arcpy
+        arcpy.env.workspace = path
+        if arcpy.Exists(layerName):
+            arcpy.Delete_management(layerName)
+        arcpy.management.CreateFeatureclass(path, layerName, "POINT", "", "", "", arcpy.SpatialReference(4326))
+        for name, fieldType in self.fields:
+            arcpy.management.AddField(layerName, name, fieldType)
+        self.insertFields = [name for name, fieldType in self.fields] + ["SHAPE@XY"]
+
+    def writeBatch(self, batch):
+        with self.arcpy.da.InsertCursor(f"{self.path}/{self.layerName}", self.insertFields) as insert_cursor:
+            for row in batch:
+                insert_cursor.insertRow(row)
+
+##Output backends by name, and the file extensions that select them
+pointWriters = {"gpkg": GeoPackageWriter, "geojsonseq": GeoJSONSeqWriter, "fgb": FlatGeobufWriter, "arcpy": ArcpyPointWriter}
+backendExtensions = {".gpkg": "gpkg", ".geojsonl": "geojsonseq", ".geojsons": "geojsonseq", ".ndjson": "geojsonseq",
+                     ".fgb": "fgb", ".gdb": "arcpy"}
+
+##Opens a point writer, picking the backend from the path extension when none is given
+def openPointWriter(path, layerName, fields, backend=None, batchSize=10000):
+    if backend is None:
+        backend = backendExtensions.get(os.path.splitext(path)[1].lower())
+        if backend is None:
+            raise ValueError(f"No point writer for '{path}'. Use one of {sorted(backendExtensions)}.")
+    return pointWriters[backend](path, layerName, fields, batchSize)
+
+##Writes the rows of a mapping type (AFSCCount, Base or AFSC) to a point layer and returns the row count
+def writePointLayer(path, layerName, mappingVar, rows, backend=None, batchSize=10000):
+    with openPointWriter(path, layerName, mappingFields[mappingVar], backend, batchSize) as writer:
+        rowsWritten = writer.writeRows(rows)
+    print(f"Point layer '{layerName}' with {rowsWritten} points written to {path}")
+    return rowsWritten